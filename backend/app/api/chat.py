@@ -1,11 +1,12 @@
 from fastapi import APIRouter, HTTPException, Depends
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from typing import List, Dict
-from app.services.model_service import ModelService
+from typing import List, Dict, Optional
+from app.services.model_service import ModelService, get_model_service
 from app.context import get_service_context
 import re
 import logging
-import json
+import orjson
 from app.services.canvas_service import CanvasService
 from app.services.stevens_service import StevensService
 
@@ -23,10 +24,6 @@ def get_stevens_service():
     return StevensService()
 
 
-def get_model_service():
-    return ModelService()
-
-
 class ChatMessage(BaseModel):
     role: str
     content: str
@@ -34,11 +31,16 @@ class ChatMessage(BaseModel):
 
 class ChatRequest(BaseModel):
     messages: List[ChatMessage]
+    stream: bool = False
+    # Client-chosen id for a multi-turn chat; when set, send only new turns,
+    # and DELETE /api/chat/session/{session_id} when the chat ends
+    session_id: Optional[str] = None
 
 
 class ChatResponse(BaseModel):
     response: str
     sources: List[dict] = []
+    session_id: Optional[str] = None
 
 
 def extract_course_reference(message: str) -> str:
@@ -61,16 +63,59 @@ async def chat(
     canvas_service: CanvasService = Depends(get_canvas_service),
     model_service: ModelService = Depends(get_model_service)
 ) -> ChatResponse:
+    if request.stream:
+        return _sse_response(model_service, request)
+
     try:
         # Get completion from Azure agent
         response = await model_service.get_completion(
-            messages=[{
-                "role": msg.role,
-                "content": msg.content
-            } for msg in request.messages])
+            messages=[msg.model_dump() for msg in request.messages],
+            session_id=request.session_id)
 
-        return ChatResponse(response=response["content"])
+        return ChatResponse(response=response["content"],
+                            session_id=request.session_id)
 
     except Exception as e:
         logger.error(f"Error in chat endpoint: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.delete("/session/{session_id}")
+async def end_chat_session(
+    session_id: str,
+    model_service: ModelService = Depends(get_model_service)
+) -> Dict[str, bool]:
+    """
+    End a multi-turn chat. Its history is kept until then; a later request
+    with the same session_id starts a new conversation
+    """
+    if not await model_service.end_session(session_id):
+        raise HTTPException(status_code=404, detail="Unknown session_id")
+    return {"ended": True}
+
+
+@router.post("/stream")
+async def chat_stream(
+    request: ChatRequest,
+    model_service: ModelService = Depends(get_model_service)
+) -> StreamingResponse:
+    """Stream the agent's reply as Server-Sent Events"""
+    return _sse_response(model_service, request)
+
+
+def _sse_response(model_service: ModelService,
+                  request: ChatRequest) -> StreamingResponse:
+    messages = [msg.model_dump() for msg in request.messages]
+
+    async def event_stream():
+        try:
+            async for chunk in model_service.get_completion_stream(
+                    messages, request.session_id):
+                yield b"data: " + orjson.dumps({"content": chunk}) + b"\n\n"
+        except Exception as e:
+            logger.error(f"Error in chat stream endpoint: {str(e)}")
+            yield (b"event: error\ndata: " +
+                   orjson.dumps({"detail": str(e)}) + b"\n\n")
+        yield b"data: [DONE]\n\n"
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream")
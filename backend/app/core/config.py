@@ -16,6 +16,12 @@ class Settings(BaseSettings):
     CONN_STR: str
     AGENT_ID: str
 
+    EMBEDDINGS_MODEL: Optional[str] = None
+    MAX_COMPLETION_TOKENS: int = 500
+    BATCH_MODEL: Optional[str] = None
+
+    AISEARCH_SEMANTIC_CONFIG: Optional[str] = None
+
     DATABASE_URL: str = "sqlite:///./dummy.db"
 
     COSMOSDB_URI: Optional[str] = None
@@ -1,11 +1,14 @@
 import os
-import requests
+import asyncio
+import httpx
 from datetime import datetime, timezone, timedelta
-from typing import List, Dict, Optional, Any, Union
+from typing import List, Dict, Optional, Any, Tuple, Union
 import logging
-import json
+import threading
+import time
 import re
 from app.core.config import settings
+from cachetools import TTLCache
 from tzlocal import get_localzone
 from zoneinfo import ZoneInfo
 
@@ -14,6 +17,23 @@ logging.basicConfig(
     format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
 logger = logging.getLogger(__name__)
 
+# Courses per /announcements request; longer context_codes[] lists are split
+# into several requests run concurrently
+ANNOUNCEMENT_CONTEXTS_PER_REQUEST = 50
+# Keep idle Canvas connections for a minute so back-to-back tool calls skip
+# the TLS handshake, and retry failed connection attempts (not requests)
+CANVAS_POOL_LIMITS = httpx.Limits(max_connections=32,
+                                  max_keepalive_connections=16,
+                                  keepalive_expiry=60)
+CANVAS_CONNECT_RETRIES = 3
+# Enrollments rarely change during a session, and nearly every Canvas call
+# (name matching, the all-courses helpers) starts from the course list
+COURSES_CACHE_TTL = 600
+# Per-course results, by course ID. A user drilling into one course after an
+# all-courses question gets it from memory; announcements go stale sooner
+ASSIGNMENTS_CACHE_TTL = 300
+ANNOUNCEMENTS_CACHE_TTL = 120
+
 
 class CanvasService:
 
@@ -21,15 +41,42 @@ class CanvasService:
         self.base_url = "https://sit.instructure.com/api/v1/"
         self.canvas_token = settings.CANVAS_API_KEY
         self.headers = {"Authorization": f"Bearer {self.canvas_token}"}
+        # One pooled HTTP/2 client for every call, so repeat requests reuse
+        # the connection instead of a new TCP/TLS handshake each time
+        self._client = httpx.Client(
+            headers=self.headers,
+            timeout=30.0,
+            # Canvas redirects some course and pagination URLs
+            follow_redirects=True,
+            transport=httpx.HTTPTransport(http2=True,
+                                          limits=CANVAS_POOL_LIMITS,
+                                          retries=CANVAS_CONNECT_RETRIES))
+        self._async_client: Optional[httpx.AsyncClient] = None
+        # (monotonic fetch time, courses) of the last successful fetch
+        self._courses: Tuple[float, List[Dict]] = (0.0, [])
+        # Used by the async methods only, which all run on the event loop
+        self._assignments_cache = TTLCache(maxsize=64,
+                                           ttl=ASSIGNMENTS_CACHE_TTL)
+        self._announcements_cache = TTLCache(maxsize=64,
+                                             ttl=ANNOUNCEMENTS_CACHE_TTL)
+        # Lowercased course query -> {"id", "name"}; only matches are kept,
+        # so a failed lookup is retried on the next call. Expires with the
+        # course list, and is locked since get_course_info runs in worker
+        # threads and cachetools caches are not thread-safe
+        self._course_matches = TTLCache(maxsize=64, ttl=COURSES_CACHE_TTL)
+        self._course_matches_lock = threading.Lock()
 
-    def get_current_courses(self) -> List[Dict]:
+    def get_current_courses(self, force_refresh: bool = False) -> List[Dict]:
         """Get list of current courses"""
+        fetched_at, courses = self._courses
+        if (courses and not force_refresh
+                and time.monotonic() - fetched_at < COURSES_CACHE_TTL):
+            return courses
         try:
             url = f"{self.base_url}/courses"
             logger.info(f"Fetching courses from: {url}")
-            response = requests.get(
+            response = self._client.get(
                 f"{self.base_url}/courses",
-                headers=self.headers,
                 params={"enrollment_state": "active"},
             )
             logger.info(f"Courses API Response Status: {response.status_code}")
@@ -37,6 +84,8 @@ class CanvasService:
             response.raise_for_status()
             courses = response.json()
             logger.info(f"Retrieved courses: {courses}")
+            # Stored as one tuple so threads always see a matching pair
+            self._courses = (time.monotonic(), courses)
             return courses
         except Exception as e:
             logger.error(f"Error getting courses: {str(e)}", exc_info=True)
@@ -46,11 +95,7 @@ class CanvasService:
         """Get upcoming assignments for all courses"""
         try:
             all_courses = self.get_current_courses()
-            course_infos = [{
-                "id": course["id"],
-                "name": course["name"]
-            } for course in all_courses]
-            assignments = self.get_assignments_for_course(course_infos)
+            assignments = self.get_assignments_for_course(all_courses)
             return assignments[
                 "courses"] if "courses" in assignments else assignments
         except Exception as e:
@@ -84,9 +129,8 @@ class CanvasService:
         try:
             url = f"{self.base_url}/courses/{course_id}/assignments"
             logger.info(f"Fetching raw assignments from: {url}")
-            response = requests.get(
+            response = self._client.get(
                 url,
-                headers=self.headers,
                 params={"include[]":
                         ["submission"]},  # Include submission data
             )
@@ -113,12 +157,13 @@ class CanvasService:
             course_infos = []
             # The course parameter can be a string, int, or a list of course dicts
             if isinstance(course, str):
-                course_infos = self.extract_course_identifier(course)
-                logger.info(f"======Course info: {course_infos}=======")
-                if not course_infos:
+                course_info = self.extract_course_identifier(course)
+                logger.info(f"======Course info: {course_info}=======")
+                if not course_info:
                     logger.warning(
                         f"No course ID found for identifier: {course}")
                     return {"courses": []}
+                course_infos = [course_info]
             elif isinstance(course, list):
                 course_infos = course
             else:
@@ -140,48 +185,14 @@ class CanvasService:
                 )
                 url = f"{self.base_url}/courses/{course_id}/assignments"
                 logger.info(f"Fetching assignments from: {url}")
-                response = requests.get(url,
-                                        headers=self.headers,
-                                        params={"include[]": ["submission"]})
+                response = self._client.get(url,
+                                            params={"include[]": ["submission"]})
                 if response.status_code != 200:
                     logger.error(
                         f"Error response for assignments: {response.text}")
                     continue
-                assignments = response.json()
-                logger.info(f"Retrieved {len(assignments)} total assignments")
-                now = datetime.now(timezone.utc)
-                # Get assignments due in the next 2 weeks
-                two_weeks_from_now = now + timedelta(weeks=2)
-                upcoming_assignments = []
-                for assignment in assignments:
-                    due_at = assignment.get("due_at")
-                    if due_at:
-                        try:
-                            due_date_utc = datetime.fromisoformat(
-                                due_at.replace("Z", "+00:00"))
-                            # Convert to local timezone
-                            due_date_local = due_date_utc.astimezone(local_tz)
-                            if now <= due_date_utc <= two_weeks_from_now:
-                                assignment_info = {
-                                    "name":
-                                    assignment.get("name"),
-                                    "due_at":
-                                    due_date_local.isoformat(),
-                                    "points_possible":
-                                    assignment.get("points_possible"),
-                                    "html_url":
-                                    assignment.get("html_url"),
-                                    "description":
-                                    assignment.get("description"),
-                                }
-                                logger.info(
-                                    f"Found upcoming assignment: {assignment_info['name']} due at {due_date_local}"
-                                )
-                                upcoming_assignments.append(assignment_info)
-                        except ValueError as e:
-                            logger.error(
-                                f"Error parsing date {due_at}: {str(e)}")
-                upcoming_assignments.sort(key=lambda x: x["due_at"])
+                upcoming_assignments = self._upcoming_assignments(
+                    response.json(), local_tz)
                 all_courses_assignments.append({
                     "course_name":
                     course_info["name"],
@@ -213,12 +224,21 @@ class CanvasService:
         """Get course information from the Azure agent"""
         # This would be handled by your Azure agent's course matching logic
         # For now, return the course data directly from Canvas
-        courses = self.get_current_courses()
-        # Basic matching logic - in production this would be handled by the Azure agent
-        for course in courses:
-            if query.lower() in course["name"].lower():
-                return {"id": course["id"], "name": course["name"]}
-        return None
+        # The agent often asks for several things about the same course in
+        # one turn, so remember matches instead of refetching the course list
+        key = query.strip().lower()
+        with self._course_matches_lock:
+            course_info = self._course_matches.get(key)
+        if course_info is None:
+            courses = self.get_current_courses()
+            # Basic matching logic - in production this would be handled by the Azure agent
+            for course in courses:
+                if key in course["name"].lower():
+                    course_info = {"id": course["id"], "name": course["name"]}
+                    with self._course_matches_lock:
+                        self._course_matches[key] = course_info
+                    break
+        return course_info
 
     def get_announcements_for_course(
             self, course: Union[int, str, List[Dict]]) -> Dict:
@@ -243,14 +263,15 @@ class CanvasService:
             # Determine the course list based on the input parameter type
             course_infos = []
             if isinstance(course, str):
-                course_infos = self.extract_course_identifier(course)
+                course_info = self.extract_course_identifier(course)
                 logger.info(
-                    f"Extracted course info from query '{course}': {course_infos}"
+                    f"Extracted course info from query '{course}': {course_info}"
                 )
-                if not course_infos:
+                if not course_info:
                     logger.warning(
                         f"No course ID found for identifier: {course}")
                     return {"courses": []}
+                course_infos = [course_info]
             elif isinstance(course, list):
                 course_infos = course
             else:  # assume integer course id
@@ -282,53 +303,14 @@ class CanvasService:
                 logger.info(
                     f"Fetching announcements for course {course_name} (ID: {course_id}) from: {url} with params: {params}"
                 )
-                response = requests.get(url,
-                                        headers=self.headers,
-                                        params=params)
+                response = self._client.get(url, params=params)
                 if response.status_code != 200:
                     logger.error(
                         f"Error response for announcements (course {course_id}): {response.text}"
                     )
                     continue
-                announcements = response.json()
-                ann_list = []
-                for ann in announcements:
-                    posted_at = ann.get("posted_at")
-                    # Filter for future announcements (if posted_at is in the future)
-                    if posted_at:
-                        try:
-                            posted_date_utc = datetime.fromisoformat(
-                                posted_at.replace("Z", "+00:00"))
-                            # Only include announcements from past week onwards
-                            if posted_date_utc >= one_week_ago:
-                                ann_list.append({
-                                    "title":
-                                    ann.get("title", ""),
-                                    "author": {
-                                        "display_name":
-                                        ann.get("author",
-                                                {}).get("display_name", ""),
-                                        "avatar_image_url":
-                                        ann.get("author", {}).get(
-                                            "avatar_image_url", ""),
-                                        "pronouns":
-                                        ann.get("author",
-                                                {}).get("pronouns", ""),
-                                    },
-                                    "posted_at":
-                                    ann.get("posted_at", ""),
-                                    "message":
-                                    ann.get("message", "")
-                                })
-                                logger.info(
-                                    f"Found future announcement: {ann.get('title')} posted at {posted_date_utc}"
-                                )
-                        except ValueError as e:
-                            logger.error(
-                                f"Error parsing date {posted_at}: {str(e)}")
-
-                # Sort announcements chronologically (nearest future date first)
-                ann_list.sort(key=lambda x: x["posted_at"])
+                ann_list = self._recent_announcements(response.json(),
+                                                      one_week_ago)
 
                 results.append({
                     "course_name": course_name,
@@ -343,6 +325,250 @@ class CanvasService:
                 exc_info=True)
             return {"courses": []}
 
+    @staticmethod
+    def _upcoming_assignments(assignments: List[Dict], local_tz) -> List[Dict]:
+        """Assignments due in the next two weeks, soonest first"""
+        logger.info(f"Retrieved {len(assignments)} total assignments")
+        now = datetime.now(timezone.utc)
+        # Get assignments due in the next 2 weeks
+        two_weeks_from_now = now + timedelta(weeks=2)
+        upcoming_assignments = []
+        for assignment in assignments:
+            due_at = assignment.get("due_at")
+            if due_at:
+                try:
+                    due_date_utc = datetime.fromisoformat(
+                        due_at.replace("Z", "+00:00"))
+                    # Convert to local timezone
+                    due_date_local = due_date_utc.astimezone(local_tz)
+                    if now <= due_date_utc <= two_weeks_from_now:
+                        assignment_info = {
+                            "name": assignment.get("name"),
+                            "due_at": due_date_local.isoformat(),
+                            "points_possible":
+                            assignment.get("points_possible"),
+                            "html_url": assignment.get("html_url"),
+                            "description": assignment.get("description"),
+                        }
+                        logger.info(
+                            f"Found upcoming assignment: {assignment_info['name']} due at {due_date_local}"
+                        )
+                        upcoming_assignments.append(assignment_info)
+                except ValueError as e:
+                    logger.error(f"Error parsing date {due_at}: {str(e)}")
+        upcoming_assignments.sort(key=lambda x: x["due_at"])
+        return upcoming_assignments
+
+    @staticmethod
+    def _recent_announcements(announcements: List[Dict],
+                              since: datetime) -> List[Dict]:
+        """Announcements posted since `since`, oldest first"""
+        ann_list = []
+        for ann in announcements:
+            posted_at = ann.get("posted_at")
+            if posted_at:
+                try:
+                    posted_date_utc = datetime.fromisoformat(
+                        posted_at.replace("Z", "+00:00"))
+                    # Only include announcements from past week onwards
+                    if posted_date_utc >= since:
+                        ann_list.append({
+                            "title": ann.get("title", ""),
+                            "author": {
+                                "display_name":
+                                ann.get("author", {}).get("display_name", ""),
+                                "avatar_image_url":
+                                ann.get("author",
+                                        {}).get("avatar_image_url", ""),
+                                "pronouns":
+                                ann.get("author", {}).get("pronouns", ""),
+                            },
+                            "posted_at": ann.get("posted_at", ""),
+                            "message": ann.get("message", "")
+                        })
+                        logger.info(
+                            f"Found future announcement: {ann.get('title')} posted at {posted_date_utc}"
+                        )
+                except ValueError as e:
+                    logger.error(f"Error parsing date {posted_at}: {str(e)}")
+
+        # Sort announcements chronologically (nearest future date first)
+        ann_list.sort(key=lambda x: x["posted_at"])
+        return ann_list
+
+    def async_client(self) -> httpx.AsyncClient:
+        """The pooled client for the async methods, created on first use"""
+        if self._async_client is None:
+            self._async_client = httpx.AsyncClient(
+                headers=self.headers,
+                timeout=30.0,
+                follow_redirects=True,
+                transport=httpx.AsyncHTTPTransport(
+                    http2=True,
+                    limits=CANVAS_POOL_LIMITS,
+                    retries=CANVAS_CONNECT_RETRIES))
+        return self._async_client
+
+    async def aclose(self):
+        if self._async_client is not None:
+            await self._async_client.aclose()
+            self._async_client = None
+
+    async def get_assignments_for_course_async(
+            self,
+            course_info: Dict,
+            client: httpx.AsyncClient,
+            force_refresh: bool = False) -> Dict:
+        """Async get_assignments_for_course for one {"id", "name"} course"""
+        course_id = course_info["id"]
+        cached = None if force_refresh else self._assignments_cache.get(
+            course_id)
+        if cached is not None:
+            return cached
+        try:
+            response = await client.get(
+                f"{self.base_url}/courses/{course_id}/assignments",
+                params={"include[]": ["submission"]})
+            if response.status_code != 200:
+                logger.error(
+                    f"Error response for assignments: {response.text}")
+                return {"courses": []}
+            result = {
+                "courses": [{
+                    "course_name":
+                    course_info["name"],
+                    "assignments":
+                    self._upcoming_assignments(response.json(),
+                                               get_localzone()),
+                }]
+            }
+            self._assignments_cache[course_id] = result
+            return result
+        except Exception as e:
+            logger.error(
+                f"Error fetching assignments for course {course_id}: {str(e)}")
+            return {"courses": []}
+
+    async def get_announcements_for_course_async(
+            self,
+            course_info: Dict,
+            client: httpx.AsyncClient,
+            force_refresh: bool = False) -> Dict:
+        """Async get_announcements_for_course for one {"id", "name"} course"""
+        course_id = course_info["id"]
+        cached = None if force_refresh else self._announcements_cache.get(
+            course_id)
+        if cached is not None:
+            return cached
+        try:
+            response = await client.get(
+                f"{self.base_url}/courses/{course_id}/discussion_topics",
+                params={
+                    "only_announcements": "true",
+                    "per_page": 40,
+                    "page": 1,
+                })
+            if response.status_code != 200:
+                logger.error(
+                    f"Error response for announcements (course {course_id}): {response.text}"
+                )
+                return {"courses": []}
+            one_week_ago = datetime.now(timezone.utc) - timedelta(days=7)
+            result = {
+                "courses": [{
+                    "course_name":
+                    course_info["name"],
+                    "course_announcements_link":
+                    f"https://sit.instructure.com/courses/{course_id}/announcements",
+                    "announcements":
+                    self._recent_announcements(response.json(), one_week_ago)
+                }]
+            }
+            self._announcements_cache[course_id] = result
+            return result
+        except Exception as e:
+            logger.error(
+                f"Error fetching announcements for course {course_id}: {str(e)}"
+            )
+            return {"courses": []}
+
+    async def get_announcements_for_courses_async(
+            self,
+            course_infos: List[Dict],
+            client: httpx.AsyncClient,
+            force_refresh: bool = False) -> List[Dict]:
+        """
+        Past-week announcements for many courses through /announcements,
+        which takes a context_codes[] entry per course, instead of one
+        request per course. Returns one {"courses": [...]} result per
+        course, in the order given; only uncached courses are requested
+        """
+        results = {}
+        if not force_refresh:
+            for course_info in course_infos:
+                cached = self._announcements_cache.get(course_info["id"])
+                if cached is not None:
+                    results[course_info["id"]] = cached
+        missing = [c for c in course_infos if c["id"] not in results]
+        chunks = [
+            missing[i:i + ANNOUNCEMENT_CONTEXTS_PER_REQUEST]
+            for i in range(0, len(missing), ANNOUNCEMENT_CONTEXTS_PER_REQUEST)
+        ]
+        fetched = await asyncio.gather(
+            *(self._get_announcements_chunk(chunk, client)
+              for chunk in chunks))
+        for chunk, chunk_results in zip(chunks, fetched):
+            for course_info, result in zip(chunk, chunk_results):
+                results[course_info["id"]] = result
+                # A failed chunk comes back as empty results; don't keep those
+                if result["courses"]:
+                    self._announcements_cache[course_info["id"]] = result
+        return [results[course_info["id"]] for course_info in course_infos]
+
+    async def _get_announcements_chunk(
+            self, course_infos: List[Dict],
+            client: httpx.AsyncClient) -> List[Dict]:
+        one_week_ago = datetime.now(timezone.utc) - timedelta(days=7)
+        by_context = {
+            f"course_{course_info['id']}": []
+            for course_info in course_infos
+        }
+        url = f"{self.base_url}/announcements"
+        params = {
+            "context_codes[]": list(by_context),
+            "start_date": one_week_ago.date().isoformat(),
+            "per_page": 100,
+        }
+        try:
+            while url:
+                response = await client.get(url, params=params)
+                if response.status_code != 200:
+                    logger.error(
+                        f"Error response for announcements: {response.text}")
+                    return [{"courses": []} for _ in course_infos]
+                for ann in response.json():
+                    context_code = ann.get("context_code")
+                    if context_code in by_context:
+                        by_context[context_code].append(ann)
+                # The next page link already carries the query
+                url = response.links.get("next", {}).get("url")
+                params = None
+        except Exception as e:
+            logger.error(f"Error fetching announcements: {str(e)}")
+            return [{"courses": []} for _ in course_infos]
+
+        return [{
+            "courses": [{
+                "course_name":
+                course_info["name"],
+                "course_announcements_link":
+                f"https://sit.instructure.com/courses/{course_info['id']}/announcements",
+                "announcements":
+                self._recent_announcements(
+                    by_context[f"course_{course_info['id']}"], one_week_ago)
+            }]
+        } for course_info in course_infos]
+
     def get_announcements_for_all_courses(self) -> Dict:
         """
         Get announcements for all current courses.
@@ -356,11 +582,7 @@ class CanvasService:
         """
         try:
             all_courses = self.get_current_courses()
-            course_infos = [{
-                "id": course["id"],
-                "name": course["name"]
-            } for course in all_courses]
-            announcements = self.get_announcements_for_course(course_infos)
+            announcements = self.get_announcements_for_course(all_courses)
             return announcements
         except Exception as e:
             logger.error(
@@ -419,8 +641,7 @@ class CanvasService:
                 logger.info(
                     f"Fetching assignments for course {course_name} (ID: {course_id}) from: {assignments_url}"
                 )
-                assignments_response = requests.get(assignments_url,
-                                                    headers=self.headers)
+                assignments_response = self._client.get(assignments_url)
 
                 if assignments_response.status_code != 200:
                     logger.error(
@@ -444,9 +665,8 @@ class CanvasService:
                 logger.info(
                     f"Fetching submissions for course {course_name} (ID: {course_id}) from: {submissions_url}"
                 )
-                submissions_response = requests.get(submissions_url,
-                                                    headers=self.headers,
-                                                    params=params)
+                submissions_response = self._client.get(submissions_url,
+                                                        params=params)
 
                 if submissions_response.status_code != 200:
                     logger.error(
@@ -463,9 +683,8 @@ class CanvasService:
                 logger.info(
                     f"Fetching enrollment/grade data for course {course_name} (ID: {course_id}) from: {enrollment_url}"
                 )
-                enrollment_response = requests.get(enrollment_url,
-                                                   headers=self.headers,
-                                                   params=params)
+                enrollment_response = self._client.get(enrollment_url,
+                                                       params=params)
 
                 course_grade = None
                 if enrollment_response.status_code == 200:
@@ -552,11 +771,7 @@ class CanvasService:
         """
         try:
             all_courses = self.get_current_courses()
-            course_infos = [{
-                "id": course["id"],
-                "name": course["name"]
-            } for course in all_courses]
-            grades = self.get_grades_for_course(course_infos)
+            grades = self.get_grades_for_course(all_courses)
             return grades
         except Exception as e:
             logger.error(f"Error fetching grades for all courses: {str(e)}")
@@ -614,8 +829,7 @@ class CanvasService:
                 logger.info(
                     f"Fetching assignments for course {course_name} (ID: {course_id}) from: {assignments_url}"
                 )
-                assignments_response = requests.get(assignments_url,
-                                                    headers=self.headers)
+                assignments_response = self._client.get(assignments_url)
 
                 if assignments_response.status_code != 200:
                     logger.error(
@@ -639,9 +853,8 @@ class CanvasService:
                 logger.info(
                     f"Fetching submissions for course {course_name} (ID: {course_id}) from: {submissions_url}"
                 )
-                submissions_response = requests.get(submissions_url,
-                                                    headers=self.headers,
-                                                    params=params)
+                submissions_response = self._client.get(submissions_url,
+                                                        params=params)
 
                 if submissions_response.status_code != 200:
                     logger.error(
@@ -658,9 +871,8 @@ class CanvasService:
                 logger.info(
                     f"Fetching enrollment/grade data for course {course_name} (ID: {course_id}) from: {enrollment_url}"
                 )
-                enrollment_response = requests.get(enrollment_url,
-                                                   headers=self.headers,
-                                                   params=params)
+                enrollment_response = self._client.get(enrollment_url,
+                                                       params=params)
 
                 course_grade = None
                 if enrollment_response.status_code == 200:
@@ -747,11 +959,7 @@ class CanvasService:
         """
         try:
             all_courses = self.get_current_courses()
-            course_infos = [{
-                "id": course["id"],
-                "name": course["name"]
-            } for course in all_courses]
-            grades = self.get_grades_for_course(course_infos)
+            grades = self.get_grades_for_course(all_courses)
             return grades
         except Exception as e:
             logger.error(f"Error fetching grades for all courses: {str(e)}")
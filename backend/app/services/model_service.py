@@ -1,532 +1,917 @@
-# from typing import List, Dict, Optional, Any
-# import logging
-# import os
-# from azure.ai.projects import AIProjectClient
-# from azure.identity import DefaultAzureCredential
-# from pydantic import BaseModel
-# from azure.ai.projects.models import FunctionTool, ToolSet, ConnectionType
-# from app.services.user_functions import user_functions
-# from app.core.config import settings
-# from azure.core.credentials import AzureKeyCredential
-# from azure.search.documents import SearchClient
-# from azure.search.documents.models import VectorizedQuery
-
-# logger = logging.getLogger(__name__)
-
-
-# class ChatMessage(BaseModel):
-#     role: str
-#     content: str
-
-
-# class ModelService:
-
-#     def __init__(self):
-#         # Initialize Azure AI Project client with connection string
-#         self.project_client = AIProjectClient.from_connection_string(
-#             credential=DefaultAzureCredential(), conn_str=settings.CONN_STR)
-#         # Get the existing agent
-#         self.agent = self.project_client.agents.get_agent(settings.AGENT_ID)
-
-#         # Initialize embeddings client for generating vector embeddings
-#         self.embeddings = self.project_client.inference.get_embeddings_client()
-
-#         # Get Azure AI Search connection
-#         try:
-#             # Get the default search connection from project client
-#             self.search_connection = self.project_client.connections.get_default(
-#                 connection_type=ConnectionType.AZURE_AI_SEARCH,
-#                 include_credentials=True)
-
-#             # Create search client for RAG
-#             self.search_client = SearchClient(
-#                 index_name=settings.AISEARCH_INDEX_NAME,
-#                 endpoint=self.search_connection.endpoint_url,
-#                 credential=AzureKeyCredential(key=self.search_connection.key),
-#             )
-#             self.rag_enabled = False
-#             logger.info("RAG enabled with Azure AI Search")
-#         except Exception as e:
-#             logger.warning(f"Failed to initialize Azure AI Search: {str(e)}")
-#             self.rag_enabled = False
-
-#         self.toolset = ToolSet()
-#         self.toolset.add(FunctionTool(user_functions))
-
-#     async def retrieve_relevant_documents(self,
-#                                           query: str,
-#                                           top: int = 5) -> List[Dict]:
-#         """
-#         Retrieve relevant documents from Azure AI Search
-#         """
-#         if not self.rag_enabled:
-#             logger.warning("RAG is not enabled, skipping document retrieval")
-#             return []
-
-#         try:
-#             # Generate vector embedding for query
-#             embedding_model = settings.EMBEDDINGS_MODEL or "text-embedding-ada-002"
-#             embedding = self.embeddings.embed(model=embedding_model,
-#                                               input=query)
-#             search_vector = embedding.data[0].embedding
-
-#             # Create vector query
-#             vector_query = VectorizedQuery(vector=search_vector,
-#                                            k_nearest_neighbors=top,
-#                                            fields="contentVector")
-
-#             # Search for relevant documents
-#             search_results = self.search_client.search(
-#                 search_text=query,
-#                 vector_queries=[vector_query],
-#                 select=["id", "content", "filepath", "title", "url"])
-
-#             # Process search results
-#             documents = [{
-#                 "id": result["id"],
-#                 "content": result["content"],
-#                 "filepath": result.get("filepath", ""),
-#                 "title": result.get("title", ""),
-#                 "url": result.get("url", "")
-#             } for result in search_results]
-
-#             logger.debug(
-#                 f"Retrieved {len(documents)} documents for query: {query}")
-#             return documents
-
-#         except Exception as e:
-#             logger.error(f"Error retrieving documents: {str(e)}")
-#             return []
-
-#     async def get_completion(self,
-#                              messages: List[Dict[str, str]],
-#                              functions: Optional[List[Dict]] = None,
-#                              function_call: str = "auto",
-#                              temperature: float = 0.7) -> Dict[str, Any]:
-#         """
-#         Get completion from Azure AI Foundry agent with RAG enhancement
-#         """
-#         try:
-#             # Create a new thread for this conversation
-#             thread = self.project_client.agents.create_thread()
-
-#             # Get the user's query from the last user message
-#             user_query = next(
-#                 (m["content"]
-#                  for m in reversed(messages) if m["role"] == "user"), "")
-
-#             # Retrieve relevant documents using RAG if enabled
-#             relevant_docs = []
-#             if self.rag_enabled and user_query:
-#                 relevant_docs = await self.retrieve_relevant_documents(
-#                     user_query)
-
-#             # Prepare context from relevant documents
-#             context = ""
-#             if relevant_docs:
-#                 logger.info("????????? Relevant documents found: ",
-#                             relevant_docs)
-#                 context = "Here is some relevant information that might help answer the question:\n\n"
-#                 for i, doc in enumerate(relevant_docs, 1):
-#                     context += f"Document {i}:\n"
-#                     context += f"Title: {doc.get('title', 'No title')}\n"
-#                     context += f"Content: {doc['content']}\n\n"
-
-#             # Add system message with RAG context if available
-#             if context:
-#                 system_message = {
-#                     "role":
-#                     "assistant",
-#                     "content":
-#                     "You are a helpful assistant with access to Stevens Institute of Technology information. "
-#                     "Use the following context to answer the question, but respond naturally and conversationally. "
-#                     f"\n\n{context}\n\n"
-#                     "Provide a clear and concise answer. Use emojis to make it engaging. "
-#                     "Include a short encouraging message for the student."
-#                 }
-#                 self.project_client.agents.create_message(
-#                     thread_id=thread.id,
-#                     role=system_message["role"],
-#                     content=system_message["content"])
-
-#             # Add all user messages to the thread
-#             for message in messages:
-#                 self.project_client.agents.create_message(
-#                     thread_id=thread.id,
-#                     role=message["role"],
-#                     content=message["content"])
-
-#             # Process the conversation with the agent
-#             run = self.project_client.agents.create_and_process_run(
-#                 thread_id=thread.id,
-#                 agent_id=self.agent.id,
-#                 toolset=self.toolset)
-#             print("[DEBUG] Run status:", run.status)
-
-#             # Get the agent's response
-#             messages = self.project_client.agents.list_messages(
-#                 thread_id=thread.id)
-#             print("&&&&&&&&&&& MESSAGES: ", messages, "&&&&&&&&&&&")
-#             # Debug: Print out all text messages
-#             for m in messages.data:
-#                 if m.content and m.content[0].text:
-#                     print(f"[DEBUG] Agent Message (role={m.role}):",
-#                           m.content[0].text.value)
-
-#             # Handle empty case
-#             if not messages.data:
-#                 logger.warning("No text messages returned from agent.")
-#                 return {
-#                     "content": "[Error] Agent did not return any messages.",
-#                     "function_call": None
-#                 }
-
-#             # Find the last assistant message that doesn't contain the system prompt
-#             # This ensures we get the actual response, not just the RAG context
-#             latest_message = None
-#             for m in reversed(messages.data):
-#                 if m.role == "assistant":
-#                     # Skip if this is the system message we added with RAG context
-#                     if context and m.content and m.content[
-#                             0].text and context in m.content[0].text.value:
-#                         continue
-#                     latest_message = m
-#                     break
-
-#             if not latest_message:
-#                 # Try again without context filtering
-#                 latest_message = next((m for m in reversed(messages.data)
-#                                        if m.role == "assistant"), None)
-
-#             if not latest_message:
-#                 logger.warning("No assistant response found.")
-#                 return {
-#                     "content":
-#                     "[Error] Agent did not return any assistant message.",
-#                     "function_call": None
-#                 }
-
-#             content = (latest_message.content[0].text.value
-#                        if latest_message.content
-#                        and latest_message.content[0].text
-#                        and latest_message.content[0].text.value else "")
-
-#             function_call_info = None
-
-#             return {"content": content, "function_call": function_call_info}
-
-#         except Exception as e:
-#             logger.error(
-#                 f"Error getting completion from Azure agent: {str(e)}")
-#             raise
-
-#     def generate_response(self,
-#                           messages: List[ChatMessage],
-#                           function_result: Optional[str] = None,
-#                           current_function: Optional[str] = None) -> str:
-#         """
-#         Generate a response using the Azure AI Foundry agent
-#         """
-#         try:
-#             # Create a new thread
-#             thread = self.project_client.agents.create_thread()
-
-#             # Add conversation history
-#             for msg in messages:
-#                 self.project_client.agents.create_message(thread_id=thread.id,
-#                                                           role=msg.role,
-#                                                           content=msg.content)
-
-#             # Add function result if available
-#             if function_result:
-#                 context_message = (
-#                     "You are a helpful assistant with access to Stevens Institute of Technology information. "
-#                     "Use the following context to answer the question, but respond naturally and conversationally. "
-#                     f"\n\nContext: {function_result}\n\n"
-#                     "Please summarize it for the user in a clear and concise manner. Please use some emojis to make it more engaging. "
-#                     "Also include some words of encouragement and motivation to the user (keep it short), who is a student at Stevens Institute of Technology. "
-#                 )
-#                 self.project_client.agents.create_message(
-#                     thread_id=thread.id,
-#                     role="assistant",
-#                     content=context_message)
-#             else:
-#                 # Try to get RAG context for the last user message
-#                 try:
-#                     user_query = next(
-#                         (msg.content
-#                          for msg in reversed(messages) if msg.role == "user"),
-#                         "")
-#                     if user_query and self.rag_enabled:
-#                         # Convert messages to the format expected by retrieve_relevant_documents
-#                         relevant_docs = self.retrieve_relevant_documents(
-#                             user_query)
-
-#                         if relevant_docs:
-#                             context = "Here is some relevant information that might help answer the question:\n\n"
-#                             for i, doc in enumerate(relevant_docs, 1):
-#                                 context += f"Document {i}:\n"
-#                                 context += f"Title: {doc.get('title', 'No title')}\n"
-#                                 context += f"Content: {doc['content']}\n\n"
-
-#                             context_message = (
-#                                 "You are a helpful assistant with access to Stevens Institute of Technology information. "
-#                                 "Use the following context to answer the question, but respond naturally and conversationally. "
-#                                 f"\n\nContext: {context}\n\n"
-#                                 "Please summarize it for the user in a clear and concise manner. Please use some emojis to make it more engaging. "
-#                                 "Also include some words of encouragement and motivation to the user (keep it short), who is a student at Stevens Institute of Technology. "
-#                             )
-#                             self.project_client.agents.create_message(
-#                                 thread_id=thread.id,
-#                                 role="assistant",
-#                                 content=context_message)
-#                 except Exception as e:
-#                     logger.warning(f"Failed to add RAG context: {str(e)}")
-
-#             # Process with the agent
-#             run = self.project_client.agents.create_and_process_run(
-#                 thread_id=thread.id, agent_id=self.agent.id)
-
-#             # Get the response
-#             messages = self.project_client.agents.list_messages(
-#                 thread_id=thread.id)
-#             return messages.data[
-#                 -1].text if messages.data and messages.data[-1].text else ""
-
-#         except Exception as e:
-#             logger.error(f"Error generating response: {str(e)}")
-#             return "I apologize, but I encountered an error generating a response."
-
-from typing import List, Dict, Optional, Any
+from typing import (List, Dict, Optional, Any, AsyncIterator, Awaitable,
+                    Callable, Tuple)
+from array import array
+import asyncio
+import contextlib
+import functools
+import inspect
+import hashlib
 import logging
 import os
-from azure.ai.projects import AIProjectClient
-from azure.identity import DefaultAzureCredential
+import time
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from azure.ai.projects.aio import AIProjectClient
+from azure.identity.aio import DefaultAzureCredential
 from pydantic import BaseModel
-from azure.ai.projects.models import FunctionTool, ToolSet, ConnectionType
+from azure.ai.projects.models import (AsyncFunctionTool, AsyncToolSet,
+                                     ConnectionType, ListSortOrder,
+                                     MessageDeltaChunk,
+                                     RequiredFunctionToolCall,
+                                     SubmitToolOutputsAction,
+                                     ThreadMessageOptions, ThreadRun,
+                                     ToolOutput)
 from app.services.user_functions import user_functions
 from app.core.config import settings
 from azure.core.credentials import AzureKeyCredential
-from azure.search.documents import SearchClient
+from azure.core.exceptions import ClientAuthenticationError
+from azure.core.pipeline.transport import AioHttpTransport
+from azure.search.documents.aio import SearchClient
 from azure.search.documents.models import VectorizedQuery
+from cachetools import TTLCache
+import aiohttp
+import orjson
 import re
 
 logger = logging.getLogger(__name__)
 
+# Agent / connection lookups are REST round trips, so keep them across
+# ModelService instances. Keyed by (kind, id) so different AGENT_IDs don't collide.
+_LOOKUP_TTL_SECONDS = 3600
+_lookup_cache: Dict[Tuple[str, str], Tuple[float, Any]] = {}
+
+
+async def _cached_lookup(kind: str, key: str,
+                         fetch: Callable[[], Awaitable[Any]]) -> Any:
+    entry = _lookup_cache.get((kind, key))
+    now = time.monotonic()
+    if entry and now - entry[0] < _LOOKUP_TTL_SECONDS:
+        return entry[1]
+    value = await fetch()
+    _lookup_cache[(kind, key)] = (now, value)
+    return value
+
+
+def _query_key(query: str) -> str:
+    return hashlib.blake2b(query.strip().lower().encode()).hexdigest()
+
+
+def _response_key(messages: List[Dict[str, str]],
+                  function_result: Optional[str],
+                  current_function: Optional[str]) -> str:
+    payload = orjson.dumps(
+        {
+            "msgs": [[m["role"], m["content"]] for m in messages],
+            "fn": current_function,
+            "ctx": function_result
+        },
+        option=orjson.OPT_SORT_KEYS)
+    return hashlib.sha256(payload).hexdigest()
+
+
+def _quantize(vector: List[float]) -> Tuple[array, float]:
+    # Store cached embeddings as int8 plus a scale: 1 byte per dimension
+    # instead of a list of Python floats, with negligible recall loss
+    scale = max(map(abs, vector), default=0.0) / 127 or 1.0
+    return array("b", [round(v / scale) for v in vector]), scale
+
+
+def _dequantize(quantized: Tuple[array, float]) -> List[float]:
+    values, scale = quantized
+    return [v * scale for v in values]
+
+
+def _prefers_keyword_search(query: str) -> bool:
+    # A handful of words with no numbers (no course codes, years, dates) is
+    # usually a lookup a keyword query handles without an embedding
+    return len(query.split()) <= 4 and not any(c.isdigit() for c in query)
+
+
+# Keywords that likely indicate function calls
+_FUNCTION_CALL_PATTERN = re.compile(
+    "|".join((
+        # Grade-related keywords
+        r'\b(grades?|score|marks|results|gpa)\b',
+        # Assignment-related keywords
+        r'\b(assignments?|homework|due dates?|deadlines?)\b',
+        # Course registration keywords
+        r'\b(register|registration|enroll|sign up|add course)\b',
+        # Course-specific functions
+        r'\b(my\s+courses|current\s+courses|this\s+semester)\b',
+        # Announcement-related
+        r'\b(announcements?|notifications?|updates?)\b',
+        # Calendar-related
+        r'\b(calendar|schedule|timetable|events?)\b',
+        # Financial-related
+        r'\b(financial|payment|bill|tuition|fee|account)\b')),
+    re.IGNORECASE)
+
+
+def _is_function_call_query(query: str) -> bool:
+    return bool(_FUNCTION_CALL_PATTERN.search(query))
+
+
+def _invalidate_cached_lookups():
+    """
+    Drop cached lookups, e.g. after the credential failed to refresh
+    """
+    _lookup_cache.clear()
+
+
+# Static parts of the context prompts, so only the retrieved documents or
+# function result are formatted per request
+_ASSISTANT_PREAMBLE = (
+    "You are a helpful assistant with access to Stevens Institute of Technology information. "
+    "Use the following context to answer the question, but respond naturally and conversationally. "
+)
+# Everything static comes before the retrieved documents so the context
+# message starts with a byte-identical prefix the service can cache
+_RAG_SYSTEM_PREFIX = (
+    _ASSISTANT_PREAMBLE +
+    "Provide a clear and concise answer. Use emojis to make it engaging. "
+    "Include a short encouraging message for the student."
+    "\n\n"
+    "Here is some relevant information that might help answer the question:\n\n"
+)
+# Same idea for function results: the instructions lead, the result and any
+# function-specific note trail
+_FUNCTION_RESULT_PREFIX = (
+    _ASSISTANT_PREAMBLE +
+    "Please summarize it for the user in a clear and concise manner. Please use some emojis to make it more engaging. "
+    "Also include some words of encouragement and motivation to the user (keep it short), who is a student at Stevens Institute of Technology. "
+    "\n\nContext: ")
+_FUNCTION_RESULT_TAILS: Dict[str, str] = {
+    "get_announcements_for_specific_courses":
+    "\n\nInclude the link to the course announcements page.",
+    "get_announcements_for_all_courses":
+    "\n\nGroup the announcements by course.",
+    "get_course_assignments":
+    "\n\nList assignments by due date and include their links.",
+    "get_upcoming_courses_assignments":
+    "\n\nList assignments by due date and include their links.",
+    "navigate_to_workday_registration_sync":
+    "\n\nRelay the human_message as is.",
+    "navigate_to_workday_financial_account_sync":
+    "\n\nRelay the human_message as is.",
+}
+
+# The user functions are synchronous (Canvas HTTP calls, Workday automation)
+# and AsyncFunctionTool would run them on the event loop thread. Run them on a
+# bounded pool instead so tool calls don't stall other requests.
+_AZURE_POOL = ThreadPoolExecutor(max_workers=32, thread_name_prefix="azure-sdk")
+
+
+def shutdown_tool_pool():
+    """
+    Stop the tool thread pool. Every ModelService shares it, so this runs
+    once at application shutdown rather than from ModelService.close()
+    """
+    _AZURE_POOL.shutdown(wait=False)
+
+
+def _run_in_pool(func: Callable[..., Any]) -> Callable[..., Awaitable[Any]]:
+    if inspect.iscoroutinefunction(func):
+        # Already non-blocking; runs directly on the event loop
+        return func
+
+    # functools.wraps keeps the name, docstring and signature that
+    # AsyncFunctionTool introspects to build the function definition
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            _AZURE_POOL, functools.partial(func, *args, **kwargs))
+
+    return wrapper
+
+
+# Function definitions are derived from user_functions by introspection, so
+# build them once at import and share the toolset across services and runs.
+_FUNCTION_TOOL = AsyncFunctionTool({_run_in_pool(f) for f in user_functions})
+_TOOLSET = AsyncToolSet()
+_TOOLSET.add(_FUNCTION_TOOL)
+# ToolSet.definitions rebuilds its list on every access; the tools never
+# change, so take it once and pass the same list to every run
+_TOOL_DEFINITIONS = _TOOLSET.definitions
+
+# Reply budgets for summarizing a given function's result. Generation time is
+# linear in output length, so short factual answers get a small budget;
+# anything unlisted falls back to settings.MAX_COMPLETION_TOKENS.
+MAX_TOKENS_BY_FN: Dict[str, int] = {
+    "get_academic_calendar_event": 120,
+    "get_current_courses": 150,
+    "get_grades_for_course": 150,
+    "get_advisors_info_sync": 150,
+    "navigate_to_workday_registration_sync": 100,
+    "navigate_to_workday_financial_account_sync": 100,
+    "get_course_assignments": 200,
+    "get_grades": 250,
+    "get_announcements_for_specific_courses": 300,
+    "get_upcoming_courses_assignments": 300,
+    "get_program_requirements": 400,
+    "get_announcements_for_all_courses": 500,
+}
+
+_RUN_POLL_INTERVAL = 0.5
+_ACTIVE_RUN_STATUSES = ("queued", "in_progress", "requires_action")
+
 
 class ChatMessage(BaseModel):
     role: str
     content: str
 
 
+class EmbeddingBatcher:
+    """
+    Coalesce concurrent embedding requests into a single embeddings call.
+
+    Requests are queued for up to `max_wait` seconds (or until `max_batch_size`
+    are waiting) and then sent as one `embed(input=[...])` request.
+    """
+
+    def __init__(self,
+                 embeddings_client,
+                 model: str,
+                 max_batch_size: int = 16,
+                 max_wait: float = 0.01):
+        self.embeddings_client = embeddings_client
+        self.model = model
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+
+    async def embed(self, text: str) -> List[float]:
+        # The queue and worker are bound to the running loop, so create them lazily
+        if self._worker is None or self._worker.done():
+            self._queue = asyncio.Queue()
+            self._worker = asyncio.create_task(self._run())
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((text, future))
+        return await future
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(
+                        self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            await self._flush(batch)
+
+    async def _flush(self, batch: List[Tuple[str, asyncio.Future]]):
+        try:
+            response = await self.embeddings_client.embed(
+                model=self.model,
+                input=[text for text, _ in batch])
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for item in response.data:
+            future = batch[item.index][1]
+            if not future.done():
+                future.set_result(item.embedding)
+        logger.debug(f"Embedded batch of {len(batch)} queries")
+
+    def close(self):
+        if self._worker is not None:
+            self._worker.cancel()
+            self._worker = None
+
+
 class ModelService:
 
     def __init__(self):
+        # One keep-alive connection pool shared by the project (agents) and
+        # search clients, so requests reuse warm TLS connections instead of
+        # each client opening its own
+        self._http_session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=64,
+                                           keepalive_timeout=60))
+        self._transport = AioHttpTransport(session=self._http_session,
+                                           session_owner=False)
+
         # Initialize Azure AI Project client with connection string
+        self.credential = DefaultAzureCredential()
         self.project_client = AIProjectClient.from_connection_string(
-            credential=DefaultAzureCredential(), conn_str=settings.CONN_STR)
+            credential=self.credential,
+            conn_str=settings.CONN_STR,
+            transport=self._transport)
+        self._closed = False
+        self.agent = None
+        self.embeddings = None
+        self.embedding_batcher = None
+        self.search_client = None
+        self.rag_enabled = False
+        self.search_available = False
+
+        self.toolset = _TOOLSET
+
+        # Reuse embeddings and search results for repeated questions. Kept
+        # separate so an embedding can be reused across different `top` values.
+        self._embedding_cache = TTLCache(maxsize=4096, ttl=300)
+        self._search_cache = TTLCache(maxsize=1024, ttl=300)
+        # Identical conversations within the window get the same reply
+        self._completion_cache = TTLCache(maxsize=512, ttl=300)
+        # generate_response summaries of the same function result; an hour
+        # keeps calendar/announcement answers from going too stale
+        self._response_cache = TTLCache(maxsize=512, ttl=3600)
+        # Chat session id -> agent thread id holding that session's history.
+        # Not evicted: clients send only new turns, so a dropped mapping
+        # would silently restart the conversation. Removed by end_session()
+        self._session_threads: Dict[str, str] = {}
+        # One turn at a time per session. Weak values, so a lock goes away
+        # once no request holds it
+        self._session_locks = weakref.WeakValueDictionary()
+        self._cache_lock = asyncio.Lock()
+
+    @classmethod
+    async def create(cls) -> "ModelService":
+        """
+        Build a ModelService and run the async lookups it depends on
+        """
+        service = cls()
+        await service._initialize()
+        return service
+
+    async def _initialize(self):
+        # Enter the client once so its HTTP pipeline (and keep-alive
+        # connections) stays open for the lifetime of the process
+        await self.project_client.__aenter__()
         # Get the existing agent
-        self.agent = self.project_client.agents.get_agent(settings.AGENT_ID)
+        self.agent = await _cached_lookup(
+            "agent", settings.AGENT_ID,
+            lambda: self.project_client.agents.get_agent(settings.AGENT_ID))
 
         # Initialize embeddings client for generating vector embeddings
-        self.embeddings = self.project_client.inference.get_embeddings_client()
+        inference = self.project_client.inference
+        self.embeddings = await inference.get_embeddings_client()
+        self.embedding_batcher = EmbeddingBatcher(
+            self.embeddings, settings.EMBEDDINGS_MODEL
+            or "text-embedding-ada-002")
 
         # Get Azure AI Search connection
         try:
             # Get the default search connection from project client
-            self.search_connection = self.project_client.connections.get_default(
-                connection_type=ConnectionType.AZURE_AI_SEARCH,
-                include_credentials=True)
+            self.search_connection = await _cached_lookup(
+                "connection", ConnectionType.AZURE_AI_SEARCH,
+                lambda: self.project_client.connections.get_default(
+                    connection_type=ConnectionType.AZURE_AI_SEARCH,
+                    include_credentials=True))
 
             # Create search client for RAG
             self.search_client = SearchClient(
                 index_name=settings.AISEARCH_INDEX_NAME,
                 endpoint=self.search_connection.endpoint_url,
                 credential=AzureKeyCredential(key=self.search_connection.key),
+                transport=self._transport,
             )
             # Default RAG to disabled - will be dynamically enabled based on query analysis
             self.rag_enabled = False
             self.search_available = True  # Flag indicating search is available but not always used
             logger.info("RAG search available but disabled by default")
         except Exception as e:
+            if isinstance(e, ClientAuthenticationError):
+                _invalidate_cached_lookups()
             logger.warning(f"Failed to initialize Azure AI Search: {str(e)}")
             self.rag_enabled = False
             self.search_available = False
 
-        self.toolset = ToolSet()
-        self.toolset.add(FunctionTool(user_functions))
+    async def close(self):
+        """
+        Close the Azure clients and release their connection pools
+        """
+        if self._closed:
+            return
+        self._closed = True
+        if self.embedding_batcher is not None:
+            self.embedding_batcher.close()
+        for client in (self.search_client, self.embeddings,
+                       self.project_client, self.credential):
+            if client is None:
+                continue
+            try:
+                await client.close()
+            except Exception as e:
+                logger.warning(f"Error closing Azure client: {str(e)}")
+        await self._http_session.close()
 
     async def retrieve_relevant_documents(self,
                                           query: str,
-                                          top: int = 5) -> List[Dict]:
+                                          top: Optional[int] = None) -> List[Dict]:
         """
-        Retrieve relevant documents from Azure AI Search
+        Retrieve relevant documents from Azure AI Search.
+
+        Short queries are usually narrow, so they get fewer documents (and a
+        smaller prompt) unless `top` is given explicitly.
         """
         if not self.search_available:
             logger.warning(
                 "RAG search is not available, skipping document retrieval")
             return []
 
-        try:
-            # Generate vector embedding for query
-            embedding_model = settings.EMBEDDINGS_MODEL or "text-embedding-ada-002"
-            embedding = self.embeddings.embed(model=embedding_model,
-                                              input=query)
-            search_vector = embedding.data[0].embedding
+        if top is None:
+            top = 3 if len(query) < 40 else 5
+
+        key = _query_key(query)
+        async with self._cache_lock:
+            cached_documents = self._search_cache.get((key, top))
+            cached_vector = self._embedding_cache.get(key)
+        if cached_documents is not None:
+            logger.debug(f"Search cache hit for query: {query}")
+            return cached_documents
 
-            # Create vector query
-            vector_query = VectorizedQuery(vector=search_vector,
-                                           k_nearest_neighbors=top,
-                                           fields="contentVector")
+        try:
+            search_kwargs: Dict[str, Any] = {}
+            if _prefers_keyword_search(query):
+                # Short lexical queries match well on keywords alone, so skip
+                # the embedding round trip and let the semantic ranker (if the
+                # index has one configured) order the results
+                if settings.AISEARCH_SEMANTIC_CONFIG:
+                    search_kwargs = {
+                        "query_type": "semantic",
+                        "semantic_configuration_name":
+                        settings.AISEARCH_SEMANTIC_CONFIG
+                    }
+            else:
+                # Generate vector embedding for query
+                if cached_vector is None:
+                    search_vector = await self.embedding_batcher.embed(query)
+                    async with self._cache_lock:
+                        self._embedding_cache[key] = _quantize(search_vector)
+                else:
+                    search_vector = _dequantize(cached_vector)
+
+                # Create vector query
+                search_kwargs["vector_queries"] = [
+                    VectorizedQuery(vector=search_vector,
+                                    k_nearest_neighbors=top,
+                                    fields="contentVector")
+                ]
 
             # Search for relevant documents
-            search_results = self.search_client.search(
+            search_results = await self.search_client.search(
                 search_text=query,
-                vector_queries=[vector_query],
-                select=["id", "content", "filepath", "title", "url"])
+                select=["content", "title"],
+                top=top,
+                **search_kwargs)
 
-            # Process search results
+            # Only title and content make it into the prompt
             documents = [{
-                "id": result["id"],
                 "content": result["content"],
-                "filepath": result.get("filepath", ""),
-                "title": result.get("title", ""),
-                "url": result.get("url", "")
-            } for result in search_results]
+                "title": result.get("title", "")
+            } async for result in search_results]
 
             logger.debug(
                 f"Retrieved {len(documents)} documents for query: {query}")
+            async with self._cache_lock:
+                self._search_cache[(key, top)] = documents
             return documents
 
         except Exception as e:
             logger.error(f"Error retrieving documents: {str(e)}")
             return []
 
-    async def get_completion(self,
-                             messages: List[Dict[str, str]],
-                             functions: Optional[List[Dict]] = None,
-                             function_call: str = "auto",
-                             temperature: float = 0.7) -> Dict[str, Any]:
+    async def _prepare_thread(self,
+                              messages: List[Dict[str, str]],
+                              thread_id: Optional[str] = None
+                              ) -> Tuple[str, Optional[str]]:
         """
-        Get completion from Azure AI Foundry agent with RAG enhancement
-        """
-        try:
-            # Create a new thread for this conversation
-            thread = self.project_client.agents.create_thread()
+        Create the agent thread for a conversation, adding RAG context when useful.
 
-            # Get the user's query from the last user message
-            user_query = next(
-                (m["content"]
-                 for m in reversed(messages) if m["role"] == "user"), "")
+        A new thread starts with the context, ahead of the conversation.
+        With `thread_id`, `messages` are only the new turns of a conversation
+        the thread already holds, and are appended to it instead; the context
+        is then left for the run's additional instructions, so the session
+        thread doesn't collect a context message every turn.
 
-            # Determine if RAG should be used for this query
-            use_rag = self._should_use_rag(user_query)
+        Returns the thread id and the context for the run (or None).
+        """
+        # Get the user's query from the last user message
+        user_query = next(
+            (m["content"]
+             for m in reversed(messages) if m["role"] == "user"), "")
+
+        # Determine if RAG should be used for this query
+        use_rag = self._should_use_rag(user_query)
+
+        history = [
+            ThreadMessageOptions(role=message["role"],
+                                 content=message["content"])
+            for message in messages
+        ]
 
-            # Retrieve relevant documents using RAG if enabled
-            relevant_docs = []
-            if use_rag and user_query:
-                relevant_docs = await self.retrieve_relevant_documents(
-                    user_query)
-
-            # Prepare context from relevant documents
-            context = ""
-            if relevant_docs:
-                logger.info(f"Relevant documents found: {len(relevant_docs)}")
-                context = "Here is some relevant information that might help answer the question:\n\n"
-                for i, doc in enumerate(relevant_docs, 1):
-                    context += f"Document {i}:\n"
-                    context += f"Title: {doc.get('title', 'No title')}\n"
-                    context += f"Content: {doc['content']}\n\n"
-
-            # Add system message with RAG context if available
+        retrieve = use_rag and bool(user_query)
+        if thread_id is None:
+            # The context has to come first, so the thread is created with
+            # it in one request once the documents are in
+            relevant_docs = (await self.retrieve_relevant_documents(user_query)
+                             if retrieve else [])
+            context = self._rag_context(relevant_docs)
             if context:
-                system_message = {
-                    "role":
-                    "assistant",
-                    "content":
-                    "You are a helpful assistant with access to Stevens Institute of Technology information. "
-                    "Use the following context to answer the question, but respond naturally and conversationally. "
-                    f"\n\n{context}\n\n"
-                    "Provide a clear and concise answer. Use emojis to make it engaging. "
-                    "Include a short encouraging message for the student."
-                    #
-                }
-                self.project_client.agents.create_message(
-                    thread_id=thread.id,
-                    role=system_message["role"],
-                    content=system_message["content"])
-
-            # Add all user messages to the thread
-            for message in messages:
-                self.project_client.agents.create_message(
-                    thread_id=thread.id,
-                    role=message["role"],
-                    content=message["content"])
-
-            # Process the conversation with the agent
-            run = self.project_client.agents.create_and_process_run(
-                thread_id=thread.id,
-                agent_id=self.agent.id,
-                toolset=self.toolset)
-            print("[DEBUG] Run status:", run.status)
-
-            # Get the agent's response
-            messages = self.project_client.agents.list_messages(
-                thread_id=thread.id)
-            print("&&&&&&&&&&& MESSAGES: ", messages, "&&&&&&&&&&&")
-            # Debug: Print out all text messages
-            for m in messages.data:
-                if m.content and m.content[0].text:
-                    print(f"[DEBUG] Agent Message (role={m.role}):",
-                          m.content[0].text.value)
-
-            # Handle empty case
-            if not messages.data:
-                logger.warning("No text messages returned from agent.")
-                return {
-                    "content": "[Error] Agent did not return any messages.",
-                    "function_call": None
-                }
+                history.insert(
+                    0, ThreadMessageOptions(role="assistant",
+                                            content=context))
+            return await self._create_thread(history), None
+
+        # Appending the new turns doesn't depend on the documents, so run
+        # the two concurrently
+        if retrieve:
+            thread_id, relevant_docs = await asyncio.gather(
+                self._append_messages(thread_id, history),
+                self.retrieve_relevant_documents(user_query))
+        else:
+            thread_id = await self._append_messages(thread_id, history)
+            relevant_docs = []
+        return thread_id, self._rag_context(relevant_docs)
+
+    @staticmethod
+    def _rag_context(relevant_docs: List[Dict]) -> Optional[str]:
+        if not relevant_docs:
+            return None
+        logger.info(f"Relevant documents found: {len(relevant_docs)}")
+        parts = [_RAG_SYSTEM_PREFIX]
+        parts.extend(f"Document {i}:\n"
+                     f"Title: {doc.get('title', 'No title')}\n"
+                     f"Content: {doc['content']}\n\n"
+                     for i, doc in enumerate(relevant_docs, 1))
+        return "".join(parts)
+
+    async def _create_thread(self, history: List[ThreadMessageOptions]) -> str:
+        thread = await self.project_client.agents.create_thread(
+            messages=history)
+        return thread.id
+
+    async def _append_messages(self, thread_id: str,
+                               history: List[ThreadMessageOptions]) -> str:
+        # Sequential on purpose: the thread keeps messages in creation order
+        for message in history:
+            await self.project_client.agents.create_message(
+                thread_id=thread_id,
+                role=message.role,
+                content=message.content)
+        return thread_id
+
+    async def _run_agent(
+            self,
+            thread_id: str,
+            temperature: Optional[float] = None,
+            max_completion_tokens: Optional[int] = None,
+            additional_instructions: Optional[str] = None
+    ) -> Tuple[Optional[str], bool]:
+        """
+        Run the agent on a prepared thread and return its reply text, and
+        whether the run called any tools
+        """
+        run, called_tools = await self._process_run(thread_id, temperature,
+                                                    max_completion_tokens,
+                                                    additional_instructions)
+        logger.debug("Run status: %s", run.status)
+        # A failed, cancelled or expired run adds no reply, and on a session
+        # thread the newest assistant message is then the previous turn's
+        if run.status != "completed":
+            logger.warning(f"Agent run ended with status {run.status}")
+            return None, called_tools
+
+        # Newest first, so long session threads still return the latest
+        # turns within the default page size
+        messages = await self.project_client.agents.list_messages(
+            thread_id=thread_id, order=ListSortOrder.DESCENDING)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f"Thread messages: {messages}")
+        return self._extract_latest_assistant_text(messages,
+                                                   run.id), called_tools
+
+    async def _process_run(self,
+                           thread_id: str,
+                           temperature: Optional[float],
+                           max_completion_tokens: Optional[int],
+                           additional_instructions: Optional[str] = None):
+        """
+        Create a run and drive it to completion.
 
-            # Find the last assistant message that doesn't contain the system prompt
-            # This ensures we get the actual response, not just the RAG context
-            latest_message = None
-            for m in reversed(messages.data):
-                if m.role == "assistant":
-                    # Skip if this is the system message we added with RAG context
-                    if context and m.content and m.content[
-                            0].text and context in m.content[0].text.value:
-                        continue
-                    latest_message = m
-                    break
+        Unlike create_and_process_run, which executes a step's tool calls one
+        after another, all tool calls the agent requests in a step run
+        concurrently, so the step takes as long as the slowest call.
 
-            if not latest_message:
-                # Try again without context filtering
-                latest_message = next((m for m in reversed(messages.data)
-                                       if m.role == "assistant"), None)
+        Returns the final run and whether any tool calls were executed.
+        """
+        agents = self.project_client.agents
+        run = await agents.create_run(
+            thread_id=thread_id,
+            agent_id=self.agent.id,
+            tools=_TOOL_DEFINITIONS,
+            temperature=temperature,
+            max_completion_tokens=max_completion_tokens
+            or settings.MAX_COMPLETION_TOKENS,
+            additional_instructions=additional_instructions)
+
+        called_tools = False
+        while run.status in _ACTIVE_RUN_STATUSES:
+            if run.status == "requires_action" and isinstance(
+                    run.required_action, SubmitToolOutputsAction):
+                tool_calls = run.required_action.submit_tool_outputs.tool_calls
+                tool_outputs = await self._execute_tool_calls(tool_calls)
+                called_tools = True
+                if not tool_outputs:
+                    logger.warning("No tool outputs to submit, cancelling run")
+                    return await agents.cancel_run(thread_id=thread_id,
+                                                   run_id=run.id), True
+                run = await agents.submit_tool_outputs_to_run(
+                    thread_id=thread_id,
+                    run_id=run.id,
+                    tool_outputs=tool_outputs)
+                continue
+
+            await asyncio.sleep(_RUN_POLL_INTERVAL)
+            run = await agents.get_run(thread_id=thread_id, run_id=run.id)
+
+        return run, called_tools
+
+    @staticmethod
+    async def _execute_tool_calls(tool_calls) -> List[ToolOutput]:
+        function_calls = [
+            call for call in tool_calls
+            if isinstance(call, RequiredFunctionToolCall)
+        ]
+        results = await asyncio.gather(
+            *(_FUNCTION_TOOL.execute(call) for call in function_calls),
+            return_exceptions=True)
+
+        tool_outputs = []
+        for call, result in zip(function_calls, results):
+            if isinstance(result, Exception):
+                logger.error(
+                    f"Tool {call.function.name} failed: {str(result)}")
+                result = f"Error executing {call.function.name}: {result}"
+            tool_outputs.append(
+                ToolOutput(tool_call_id=call.id, output=str(result)))
+        return tool_outputs
+
+    @staticmethod
+    def _extract_latest_assistant_text(messages,
+                                       run_id: str) -> Optional[str]:
+        """
+        Return the newest assistant reply written by run `run_id`
+        """
+        if not messages.data:
+            logger.warning("No text messages returned from agent.")
+            return None
+
+        # Only the run's own messages count: earlier turns of a session and
+        # the RAG context message we added (which has no run) are skipped
+        for m in messages.data:
+            if m.role == "assistant" and m.run_id == run_id:
+                return (m.content[0].text.value
+                        if m.content and m.content[0].text else "") or ""
+
+        logger.warning("No assistant response found.")
+        return None
 
-            if not latest_message:
-                logger.warning("No assistant response found.")
+    async def get_completion(self,
+                             messages: List[Dict[str, str]],
+                             functions: Optional[List[Dict]] = None,
+                             function_call: str = "auto",
+                             temperature: float = 0.7,
+                             session_id: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Get completion from Azure AI Foundry agent with RAG enhancement.
+
+        With a `session_id`, the conversation lives in an agent thread kept
+        for that session, so callers only send the new turn(s) and the
+        earlier history isn't re-uploaded on every request.
+        """
+        # Nothing to answer, so don't spend a thread and a run on it
+        if not any(m.get("content", "").strip() for m in messages):
+            return {"content": "", "function_call": None}
+
+        # Tool-backed answers should be deterministic: sampling only adds
+        # variance to the same data and defeats prompt caching
+        user_query = next(
+            (m["content"]
+             for m in reversed(messages) if m["role"] == "user"), "")
+        needs_tools = _is_function_call_query(user_query)
+        if needs_tools:
+            temperature = 0
+
+        # A session's reply depends on history the request doesn't carry,
+        # so only full-history requests are cacheable. Tool-backed replies
+        # aren't: a repeated Workday navigation has to open the page again
+        # and Canvas data has to be current.
+        cache_key = None
+        if session_id is None and not needs_tools:
+            cache_key = (tuple((m["role"], m["content"]) for m in messages),
+                         temperature)
+            cached = self._completion_cache.get(cache_key)
+            if cached is not None:
+                logger.debug("Completion cache hit")
+                return {"content": cached, "function_call": None}
+
+        try:
+            async with self._session_lock(session_id):
+                thread_id, context = await self._prepare_session_thread(
+                    messages, session_id)
+                content, called_tools = await self._run_agent(
+                    thread_id, temperature, additional_instructions=context)
+            if content is None:
                 return {
-                    "content":
-                    "[Error] Agent did not return any assistant message.",
+                    "content": "[Error] Agent did not return any messages.",
                     "function_call": None
                 }
 
-            content = (latest_message.content[0].text.value
-                       if latest_message.content
-                       and latest_message.content[0].text
-                       and latest_message.content[0].text.value else "")
-
+            if cache_key is not None and not called_tools:
+                self._completion_cache[cache_key] = content
             function_call_info = None
 
             return {"content": content, "function_call": function_call_info}
 
         except Exception as e:
+            if isinstance(e, ClientAuthenticationError):
+                _invalidate_cached_lookups()
             logger.error(
                 f"Error getting completion from Azure agent: {str(e)}")
             raise
 
+    async def get_completion_stream(
+            self,
+            messages: List[Dict[str, str]],
+            session_id: Optional[str] = None) -> AsyncIterator[str]:
+        """
+        Stream the agent's reply as text chunks while the run is in progress
+        """
+        async with self._session_lock(session_id):
+            thread_id, context = await self._prepare_session_thread(
+                messages, session_id)
+            async for text in self._stream_run(
+                    thread_id, additional_instructions=context):
+                yield text
+
+    def _session_lock(self, session_id: Optional[str]):
+        """
+        Serialize the turns of a chat session.
+
+        Concurrent requests for a new session would otherwise each create a
+        thread, and for an existing one would add messages to a thread that
+        already has an active run, which the agents API rejects.
+        """
+        if session_id is None:
+            return contextlib.nullcontext()
+        lock = self._session_locks.get(session_id)
+        if lock is None:
+            lock = self._session_locks[session_id] = asyncio.Lock()
+        return lock
+
+    async def end_session(self, session_id: str) -> bool:
+        """
+        Forget a chat session and delete its agent thread.
+
+        Returns False if the session wasn't known.
+        """
+        async with self._session_lock(session_id):
+            thread_id = self._session_threads.pop(session_id, None)
+            if thread_id is None:
+                return False
+            try:
+                await self.project_client.agents.delete_thread(thread_id)
+            except Exception as e:
+                logger.warning(
+                    f"Error deleting thread {thread_id}: {str(e)}")
+            return True
+
+    async def _prepare_session_thread(self, messages: List[Dict[str, str]],
+                                      session_id: Optional[str]
+                                      ) -> Tuple[str, Optional[str]]:
+        if session_id is None:
+            return await self._prepare_thread(messages)
+
+        thread_id, context = await self._prepare_thread(
+            messages, self._session_threads.get(session_id))
+        self._session_threads[session_id] = thread_id
+        return thread_id, context
+
+    async def _stream_run(
+            self,
+            thread_id: str,
+            max_completion_tokens: Optional[int] = None,
+            additional_instructions: Optional[str] = None
+    ) -> AsyncIterator[str]:
+        """
+        Run the agent on a prepared thread, yielding message deltas.
+
+        The tools are client-side functions, so when the run stops for
+        tool calls they are executed here and their outputs submitted to
+        the stream's event handler, whose events the loop below keeps
+        reading.
+        """
+        agents = self.project_client.agents
+        stream = await agents.create_stream(
+            thread_id=thread_id,
+            agent_id=self.agent.id,
+            tools=_TOOL_DEFINITIONS,
+            max_completion_tokens=max_completion_tokens
+            or settings.MAX_COMPLETION_TOKENS,
+            additional_instructions=additional_instructions)
+        # The stream itself isn't iterable; entering it yields the event
+        # handler, which is
+        async with stream as handler:
+            async for _, event_data, _ in handler:
+                if isinstance(event_data,
+                              MessageDeltaChunk) and event_data.text:
+                    yield event_data.text
+                elif (isinstance(event_data, ThreadRun)
+                      and event_data.status == "requires_action"
+                      and isinstance(event_data.required_action,
+                                     SubmitToolOutputsAction)):
+                    tool_outputs = await self._execute_tool_calls(
+                        event_data.required_action.submit_tool_outputs.
+                        tool_calls)
+                    if not tool_outputs:
+                        logger.warning(
+                            "No tool outputs to submit, cancelling run")
+                        await agents.cancel_run(thread_id=thread_id,
+                                                run_id=event_data.id)
+                        return
+                    await agents.submit_tool_outputs_to_stream(
+                        thread_id=thread_id,
+                        run_id=event_data.id,
+                        tool_outputs=tool_outputs,
+                        event_handler=handler)
+
+    async def run_batch(self,
+                        inputs: List[List[Dict[str, str]]],
+                        poll_interval: float = 60.0) -> List[str]:
+        """
+        Run many chat completions through the Azure OpenAI Batch API.
+
+        Meant for offline jobs (calendar refreshes, bulk regression
+        questions) where a 24h turnaround is fine in exchange for batch
+        pricing. Returns the reply for each conversation in `inputs`, in
+        order, or "" for requests that failed.
+        """
+        if not settings.BATCH_MODEL:
+            raise ValueError("BATCH_MODEL must be set to use run_batch")
+        if not inputs:
+            return []
+
+        client = await self.project_client.inference.get_azure_openai_client(
+            api_version="2024-10-21")
+        async with client:
+            lines = [
+                orjson.dumps({
+                    "custom_id": str(i),
+                    "method": "POST",
+                    "url": "/chat/completions",
+                    "body": {
+                        "model": settings.BATCH_MODEL,
+                        "messages": messages,
+                        "max_tokens": settings.MAX_COMPLETION_TOKENS
+                    }
+                }) for i, messages in enumerate(inputs)
+            ]
+            batch_file = await client.files.create(
+                file=("batch.jsonl", b"\n".join(lines)),
+                purpose="batch")
+            batch = await client.batches.create(
+                input_file_id=batch_file.id,
+                endpoint="/chat/completions",
+                completion_window="24h")
+            logger.info(f"Submitted batch {batch.id} with {len(inputs)} requests")
+
+            while batch.status not in ("completed", "failed", "expired",
+                                       "cancelled"):
+                await asyncio.sleep(poll_interval)
+                batch = await client.batches.retrieve(batch.id)
+
+            if batch.status != "completed" or not batch.output_file_id:
+                raise RuntimeError(
+                    f"Batch {batch.id} finished with status {batch.status}")
+
+            output = await client.files.content(batch.output_file_id)
+
+        results = [""] * len(inputs)
+        for line in output.text.splitlines():
+            if not line:
+                continue
+            record = orjson.loads(line)
+            response = record.get("response") or {}
+            if response.get("status_code") != 200:
+                continue
+            choices = response["body"].get("choices") or []
+            if choices:
+                results[int(record["custom_id"])] = (
+                    choices[0]["message"].get("content") or "")
+        return results
+
     def _should_use_rag(self, query: str) -> bool:
         """
         Determine if RAG should be used for this query based on content analysis.
@@ -547,31 +932,11 @@ class ModelService:
         if not query or query.strip() == "":
             return False
 
-        # Keywords that likely indicate function calls
-        function_call_indicators = [
-            # Grade-related keywords
-            r'\b(grades?|score|marks|results|gpa)\b',
-            # Assignment-related keywords
-            r'\b(assignments?|homework|due dates?|deadlines?)\b',
-            # Course registration keywords
-            r'\b(register|registration|enroll|sign up|add course)\b',
-            # Course-specific functions
-            r'\b(my\s+courses|current\s+courses|this\s+semester)\b',
-            # Announcement-related
-            r'\b(announcements?|notifications?|updates?)\b',
-            # Calendar-related
-            r'\b(calendar|schedule|timetable|events?)\b',
-            # Financial-related
-            r'\b(financial|payment|bill|tuition|fee|account)\b'
-        ]
-
         # Check for function call indicators
-        for pattern in function_call_indicators:
-            if re.search(pattern, query, re.IGNORECASE):
-                logger.info(
-                    f"Query likely needs function call, disabling RAG: {query}"
-                )
-                return False
+        if _is_function_call_query(query):
+            logger.info(
+                f"Query likely needs function call, disabling RAG: {query}")
+            return False
 
         # Course comparison pattern - this needs RAG
         course_comparison = re.search(
@@ -596,54 +961,102 @@ class ModelService:
         # Default to no RAG unless we're confident it's needed
         return False
 
-    def generate_response(self,
-                          messages: List[ChatMessage],
-                          function_result: Optional[str] = None,
-                          current_function: Optional[str] = None) -> str:
+    async def _prepare_response_thread(self, messages: List[Dict[str, str]],
+                                       function_result: Optional[str],
+                                       current_function: Optional[str]
+                                       ) -> Tuple[str, Optional[str]]:
         """
-        Generate a response using the Azure AI Foundry agent
+        Create the thread for generate_response: the function result to
+        summarize when there is one, otherwise RAG context
         """
-        try:
-            # Create a new thread
-            thread = self.project_client.agents.create_thread()
-
-            # Add conversation history
-            for msg in messages:
-                self.project_client.agents.create_message(thread_id=thread.id,
-                                                          role=msg.role,
-                                                          content=msg.content)
-
-            # Add function result if available
-            if function_result:
-                context_message = (
-                    "You are a helpful assistant with access to Stevens Institute of Technology information. "
-                    "Use the following context to answer the question, but respond naturally and conversationally. "
-                    f"\n\nContext: {function_result}\n\n"
-                    "Please summarize it for the user in a clear and concise manner. Please use some emojis to make it more engaging. "
-                    "Also include some words of encouragement and motivation to the user (keep it short), who is a student at Stevens Institute of Technology. "
-                )
-                self.project_client.agents.create_message(
-                    thread_id=thread.id,
-                    role="assistant",
-                    content=context_message)
-            else:
-                # Since we can't use async/await here directly, we'll skip RAG in generate_response
-                # This is a workaround since this method is not async but retrieve_relevant_documents is async
-                # The get_completion method should be preferred as it properly supports async RAG
-                logger.info(
-                    "Skipping RAG in generate_response as it's not async-compatible"
-                )
+        if not function_result:
+            return await self._prepare_thread(messages)
 
-            # Process with the agent
-            run = self.project_client.agents.create_and_process_run(
-                thread_id=thread.id, agent_id=self.agent.id)
+        # Conversation history, sent along with the thread creation
+        thread_messages = [
+            ThreadMessageOptions(role=msg["role"], content=msg["content"])
+            for msg in messages
+        ]
+        context_message = "".join(
+            (_FUNCTION_RESULT_PREFIX, function_result,
+             _FUNCTION_RESULT_TAILS.get(current_function, "")))
+        thread_messages.append(
+            ThreadMessageOptions(role="assistant", content=context_message))
+        return await self._create_thread(thread_messages), None
+
+    async def generate_response(self,
+                                messages: List[Dict[str, str]],
+                                function_result: Optional[str] = None,
+                                current_function: Optional[str] = None) -> str:
+        """
+        Generate a response using the Azure AI Foundry agent.
 
-            # Get the response
-            messages = self.project_client.agents.list_messages(
-                thread_id=thread.id)
-            return messages.data[
-                -1].text if messages.data and messages.data[-1].text else ""
+        `messages` are plain role/content dicts; callers holding ChatMessage
+        models should `model_dump()` them once at the API edge.
+        """
+        # Only summaries of a given function result are cacheable; without
+        # one the agent may call tools, and those must run again
+        cache_key = None
+        if function_result:
+            cache_key = _response_key(messages, function_result,
+                                      current_function)
+            cached = self._response_cache.get(cache_key)
+            if cached is not None:
+                logger.debug("Response cache hit")
+                return cached
+
+        try:
+            thread_id, context = await self._prepare_response_thread(
+                messages, function_result, current_function)
+            content, called_tools = await self._run_agent(
+                thread_id,
+                max_completion_tokens=MAX_TOKENS_BY_FN.get(current_function),
+                additional_instructions=context)
+            content = content or ""
+            if content and cache_key is not None and not called_tools:
+                self._response_cache[cache_key] = content
+            return content
 
         except Exception as e:
             logger.error(f"Error generating response: {str(e)}")
             return "I apologize, but I encountered an error generating a response."
+
+    async def generate_response_stream(
+            self,
+            messages: List[Dict[str, str]],
+            function_result: Optional[str] = None,
+            current_function: Optional[str] = None) -> AsyncIterator[str]:
+        """
+        Streaming variant of generate_response, yielding text as it is generated
+        """
+        thread_id, context = await self._prepare_response_thread(
+            messages, function_result, current_function)
+        async for text in self._stream_run(
+                thread_id, MAX_TOKENS_BY_FN.get(current_function), context):
+            yield text
+
+
+_model_service: Optional[ModelService] = None
+_model_service_lock = asyncio.Lock()
+
+
+async def get_model_service() -> ModelService:
+    """
+    Return the process-wide ModelService, creating it on first use
+    """
+    global _model_service
+    if _model_service is None:
+        async with _model_service_lock:
+            if _model_service is None:
+                _model_service = await ModelService.create()
+    return _model_service
+
+
+async def shutdown_model_service():
+    """
+    Close the shared ModelService, if one was created
+    """
+    global _model_service
+    if _model_service is not None:
+        await _model_service.close()
+        _model_service = None
@@ -1,4 +1,5 @@
 import logging
+from typing import Optional
 
 logger = logging.getLogger(__name__)
 
@@ -8,7 +9,8 @@ class StevensService:
     def __init__(self):
         pass
 
-    async def get_calendar_event(self) -> dict:
+    async def get_calendar_event(self,
+                                 event_type: Optional[str] = None) -> dict:
         pass
 
     # upates calendar events to outlook
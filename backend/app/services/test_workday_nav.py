@@ -3,23 +3,56 @@ Test script for Workday navigation functionality.
 This script tests the browser automation for navigating to the Workday course registration page.
 """
 
-import json
+import asyncio
+import os
+import orjson
 import time
-from user_functions import navigate_to_workday_registration
+from contextlib import contextmanager
+from user_functions import (get_workday_service,
+                            navigate_to_workday_registration,
+                            shutdown_workday_browser)
 
+# Pauses only exist so a person can watch the browser; skip them unless
+# OBSERVE=1 so the script can also be used as a timing probe
+OBSERVE = os.environ.get("OBSERVE") == "1"
 
-def test_workday_navigation():
+
+@contextmanager
+def Timer(name: str):
+    """Print the wall time of the block as a JSON line"""
+    start = time.perf_counter_ns()
+    try:
+        yield
+    finally:
+        elapsed_ms = (time.perf_counter_ns() - start) / 1e6
+        print(orjson.dumps({"step": name, "ms": round(elapsed_ms, 1)}).decode())
+
+
+async def wait_for_workday_login(timeout_ms: int):
+    """Return as soon as the browser lands on the Workday home page"""
+    service = await get_workday_service()
+    try:
+        await service.page.wait_for_url("**/home.htmld", timeout=timeout_ms)
+    except Exception:
+        print("\nStill not logged in, continuing anyway.")
+
+
+async def test_workday_navigation():
     """Test navigating to the Workday course registration page."""
     print("=" * 80)
     print("TESTING WORKDAY REGISTRATION NAVIGATION")
     print("=" * 80)
 
     print("\nCalling navigate_to_workday_registration()...")
-    result_str = navigate_to_workday_registration(mock_mode=False)
+    with Timer("navigate_to_workday_registration"):
+        # stay_open skips the service's demo pause and close; the browser is
+        # closed once when the script ends
+        result_str = await navigate_to_workday_registration(mock_mode=False,
+                                                            stay_open=True)
 
     # Parse and display the result
     try:
-        result = json.loads(result_str)
+        result = orjson.loads(result_str)
 
         print("\nFunction returned:")
         print(f"Success: {result.get('success', False)}")
@@ -36,43 +69,25 @@ def test_workday_navigation():
                 "\nThe browser window should be open. Please enter your credentials."
             )
             print(
-                "This script will continue after 60 seconds or when you press Enter..."
-            )
-
-            # Create a timeout of 60 seconds or until user presses Enter
-            timeout = 60
-            print(
-                f"Waiting up to {timeout} seconds for you to complete the login..."
+                "This script will continue as soon as the Workday home page loads (up to 60 seconds)..."
             )
-
-            for remaining in range(timeout, 0, -1):
-                print(
-                    f"\rTime remaining: {remaining} seconds (press Enter to continue)...",
-                    end="")
-
-                # Check if user pressed Enter (non-blocking)
-                import select
-                import sys
-                if select.select([sys.stdin], [], [], 0.0)[0]:
-                    sys.stdin.readline()
-                    print("\nContinuing...")
-                    break
-
-                time.sleep(1)
+            await wait_for_workday_login(timeout_ms=60_000)
 
             print("\nContinuing with the test...")
 
             # After user logs in, we can try again to navigate to registration
             print("\nCalling navigate_to_workday_registration() again...")
-            result_str = navigate_to_workday_registration(mock_mode=False)
+            with Timer("navigate_to_workday_registration_after_login"):
+                result_str = await navigate_to_workday_registration(
+                    mock_mode=False, stay_open=True)
 
             # Parse and display the new result
             try:
-                result = json.loads(result_str)
+                result = orjson.loads(result_str)
                 print("\nFunction returned (after login):")
                 print(f"Success: {result.get('success', False)}")
                 print(f"Message: {result.get('message', 'No message')}")
-            except json.JSONDecodeError:
+            except orjson.JSONDecodeError:
                 print(f"Error: Could not parse result as JSON. Raw output:")
                 print(result_str)
 
@@ -80,13 +95,14 @@ def test_workday_navigation():
         if "screenshot" in result:
             print(f"\nScreenshot saved at: {result['screenshot']}")
 
-        # Allow time to observe the browser
-        if result.get('success', False):
+        # Allow time to observe the browser, which is still open on the
+        # page the navigation reached
+        if result.get('success', False) and OBSERVE:
             print("\nBrowser should be on the academics/registration page.")
             print("Taking a 10 second pause to observe...")
-            time.sleep(10)
+            await asyncio.sleep(10)
 
-    except json.JSONDecodeError:
+    except orjson.JSONDecodeError:
         print(f"Error: Could not parse result as JSON. Raw output:")
         print(result_str)
 
@@ -94,5 +110,15 @@ def test_workday_navigation():
     print("Test complete.")
 
 
+async def main():
+    try:
+        await test_workday_navigation()
+    finally:
+        # Timed on its own so the navigation timings above don't include
+        # browser teardown
+        with Timer("shutdown_workday_browser"):
+            await shutdown_workday_browser()
+
+
 if __name__ == "__main__":
-    test_workday_navigation()
+    asyncio.run(main())
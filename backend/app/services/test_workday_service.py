@@ -1,21 +1,48 @@
 # test_workday_service.py
 
 import asyncio
+import os
+from datetime import datetime
 from playwright.async_api import async_playwright
-from app.services.workday_service_async import WorkdayService  # Adjust the import path as needed
+from app.services.workday_service import WorkdayService, user_data_dir
+
 
 async def main():
     async with async_playwright() as playwright:
-        service = WorkdayService(playwright)
-        await service.start()
-
-        # Test one of the navigation methods
-        result = await service.navigate_to_workday_registration()
-        # result = await service.navigate_to_workday_financial_account()
-
-        print("Result:", result)
+        # One persistent browser for every check: cookies and cache survive
+        # between runs, so later runs usually skip the login entirely
+        browser_context = await playwright.chromium.launch_persistent_context(
+            user_data_dir=user_data_dir, headless=False)
+        try:
+            service = WorkdayService(playwright,
+                                     browser_context=browser_context)
+            await service.start()
 
-        await service.close()
+            # Every navigation runs against the same browser and session, so
+            # only the first one pays the cold start and login
+            checks = {
+                "registration": service.navigate_to_workday_registration,
+                "financial_account":
+                service.navigate_to_workday_financial_account,
+            }
+            try:
+                for name, navigate in checks.items():
+                    result = await navigate(stay_open=True)
+                    print(f"{name} result:", result)
+                    if not result.get("success"):
+                        # Keep the page the check failed on for debugging
+                        path = os.path.join(
+                            service.screenshots_dir, "failures",
+                            f"{name}_{datetime.now().strftime('%Y-%m-%d_%H-%M-%S')}.png"
+                        )
+                        os.makedirs(os.path.dirname(path), exist_ok=True)
+                        await service.page.screenshot(path=path)
+                        print(f"{name} failure screenshot:", path)
+            finally:
+                # Closed once, after every check has run
+                await service.close()
+        finally:
+            await browser_context.close()
 
 
 if __name__ == "__main__":
@@ -1,23 +1,130 @@
-from typing import Any, Set, Callable, Optional
-import json
+from typing import (Any, AsyncIterator, Awaitable, Callable, Dict, FrozenSet,
+                    Hashable, Optional, Tuple)
+import orjson
 from app.services.canvas_service import CanvasService
 from app.services.stevens_service import StevensService
 from playwright.async_api import async_playwright
 from app.services.workday_service import WorkdayService
 import asyncio
+import logging
 import os
+from functools import lru_cache
 from threading import Thread
+from bs4 import BeautifulSoup
+from cachetools import TTLCache
+import httpx
+
+logger = logging.getLogger(__name__)
+
+# Tool output is fed straight back into the model, so only keep the fields
+# it needs to answer and cap long HTML bodies (announcements, descriptions)
+_MAX_TEXT_CHARS = 500
+_COURSE_FIELDS = ("id", "name", "course_code", "start_at", "end_at")
+
+
+def _dumps(obj: Any) -> str:
+    return orjson.dumps(obj).decode()
+
+
+def _html_to_text(html: Optional[str]) -> str:
+    if not html:
+        return ""
+    text = BeautifulSoup(html, "html.parser").get_text(" ", strip=True)
+    if len(text) > _MAX_TEXT_CHARS:
+        text = text[:_MAX_TEXT_CHARS].rstrip() + "..."
+    return text
+
+
+def _prune_courses(courses: list) -> list:
+    return [{k: course.get(k)
+             for k in _COURSE_FIELDS
+             if course.get(k) is not None} for course in courses]
+
+
+# The pruners build new dicts rather than editing in place, since the
+# Canvas results they are given may be shared through CanvasService's caches
+def _prune_assignments(result: dict) -> dict:
+    return {
+        "courses": [{
+            **course, "assignments": [{
+                **assignment, "description":
+                _html_to_text(assignment.get("description"))
+            } for assignment in course.get("assignments", [])]
+        } for course in result.get("courses", [])]
+    }
+
+
+def _prune_announcements(result: dict) -> dict:
+    return {
+        "courses": [{
+            **course, "announcements": [{
+                "title": ann.get("title", ""),
+                "author": ann.get("author", {}).get("display_name", ""),
+                "posted_at": ann.get("posted_at", ""),
+                "message": _html_to_text(ann.get("message"))
+            } for ann in course.get("announcements", [])]
+        } for course in result.get("courses", [])]
+    }
+
+
+# Services are created on first use rather than at import time
+@lru_cache(maxsize=1)
+def _canvas() -> CanvasService:
+    return CanvasService()
+
+
+@lru_cache(maxsize=1)
+def _stevens() -> StevensService:
+    return StevensService()
+
+
+# Canvas results are cached inside CanvasService. Calendar events and program
+# requirements are cached here; only the event loop touches this cache, so
+# it needs no lock
+_STEVENS_CACHE_TTL = 300
+_stevens_cache = TTLCache(maxsize=256, ttl=_STEVENS_CACHE_TTL)
+
+
+# Fetches currently in flight, by key. The TTL caches only help once a
+# result is stored; concurrent misses for the same key (several chats asking
+# for the course list at once) share the first caller's fetch instead.
+_inflight: Dict[Hashable, asyncio.Future] = {}
+
+
+async def _singleflight(key: Hashable,
+                        fetch: Callable[[], Awaitable[Any]]) -> Any:
+    future = _inflight.get(key)
+    if future is None:
+        future = asyncio.ensure_future(fetch())
+        _inflight[key] = future
+        future.add_done_callback(lambda _: _inflight.pop(key, None))
+    # One caller giving up must not cancel the fetch for the others
+    return await asyncio.shield(future)
+
+
+async def _current_courses_async() -> list:
+    return await _singleflight(
+        ("courses", ), lambda: asyncio.to_thread(_canvas().get_current_courses))
+
+
+async def _assignments_for_course_async(course: dict,
+                                        client: httpx.AsyncClient,
+                                        force_refresh: bool = False) -> dict:
+    # A forced refresh must not join an in-flight fetch that may be served
+    # from the cache, so it is keyed separately
+    return await _singleflight(
+        ("assignments", course["id"], force_refresh),
+        lambda: _canvas().get_assignments_for_course_async(
+            course, client, force_refresh))
 
-# Create singleton instances
-_canvas_service = CanvasService()
-_stevens_service = StevensService()
 
 _workday_service: Optional[WorkdayService] = None
 
 
 async def get_workday_service() -> WorkdayService:
+    """Return the shared WorkdayService, relaunching it if its browser is gone"""
     global _workday_service
-    if _workday_service is None:
+    if _workday_service is None or not _workday_service.is_alive():
         playwright = await async_playwright().start()
         _workday_service = WorkdayService(playwright)
 
@@ -25,6 +132,30 @@ async def get_workday_service() -> WorkdayService:
     return _workday_service
 
 
+async def _navigate_workday(navigate: Callable[[WorkdayService, bool],
+                                               Awaitable[dict]],
+                            stay_open: bool, success_message: str,
+                            failure_message: str) -> str:
+    """
+    Run one of WorkdayService's navigations on the shared, logged-in service
+    and shape its result for the agent. Signing in (only when the session
+    isn't already) and closing when not stay_open are left to the service.
+    """
+    service = await get_workday_service()
+    result = await navigate(service, stay_open)
+    logger.debug("Workday navigation result: %s", result)
+    return _dumps({
+        "success":
+        result["success"],
+        "message":
+        result.get("message") or result.get("error"),
+        "screenshot":
+        result.get("screenshot"),
+        "human_message":
+        success_message if result["success"] else failure_message
+    })
+
+
 async def navigate_to_workday_registration(mock_mode: bool = False,
                                            stay_open: bool = False) -> str:
     """
@@ -38,36 +169,15 @@ async def navigate_to_workday_registration(mock_mode: bool = False,
         JSON string with navigation results
     """
     try:
-        service = await get_workday_service()
-        result = await service.navigate_to_workday_registration(stay_open)
-
-        print(
-            f"***************Navigated to Workday registration page: {result}")
-
-        final_result = {
-            "success":
-            result["success"],
-            "message":
-            result["message"],
-            "screenshot":
-            result.get("screenshot"),
-            "human_message":
+        return await _navigate_workday(
+            WorkdayService.navigate_to_workday_registration, stay_open,
             ("✅ I've redirected you to the Workday course registration page.\n\n"
              "ℹ️ Here's more information on how you can register for courses: "
              "https://support.stevens.edu/support/solutions/articles/19000082229"
-             ) if result["success"] else
-            "❌ I couldn't navigate to the registration page."
-        }
-        if not stay_open:
-            await service.close()
-
-        print("[DEBUG] Tool result returned to agent:",
-              json.dumps(final_result))
-
-        return json.dumps(final_result)
+             ), "❌ I couldn't navigate to the registration page.")
 
     except Exception as e:
-        return json.dumps({
+        return _dumps({
             "success":
             False,
             "error":
@@ -91,27 +201,13 @@ async def navigate_to_workday_financial_account(mock_mode: bool = False,
         JSON string with navigation results
     """
     try:
-        service = await get_workday_service()
-        result = await service.navigate_to_workday_financial_account(stay_open)
-
-        if not stay_open:
-            await service.close()
-
-        return json.dumps({
-            "success":
-            result["success"],
-            "message":
-            result["message"],
-            "screenshot":
-            result.get("screenshot"),
-            "human_message":
-            ("✅ I've redirected you to the Workday financial account page.\n\n"
-             ) if result["success"] else
-            "❌ I couldn't navigate to the financial account page."
-        })
+        return await _navigate_workday(
+            WorkdayService.navigate_to_workday_financial_account, stay_open,
+            "✅ I've redirected you to the Workday financial account page.\n\n",
+            "❌ I couldn't navigate to the financial account page.")
 
     except Exception as e:
-        return json.dumps({
+        return _dumps({
             "success":
             False,
             "error":
@@ -126,7 +222,7 @@ async def get_advisors_info() -> str:
     try:
         service = await get_workday_service()
         advisors = service.get_advisors_list()
-        return json.dumps({
+        return _dumps({
             "success":
             True,
             "advisors":
@@ -139,7 +235,7 @@ async def get_advisors_info() -> str:
              )
         })
     except Exception as e:
-        return json.dumps({
+        return _dumps({
             "success":
             False,
             "error":
@@ -149,20 +245,26 @@ async def get_advisors_info() -> str:
         })
 
 
+async def close_canvas_client():
+    """Close the shared Canvas HTTP client, if one was opened"""
+    if _canvas.cache_info().currsize:
+        await _canvas().aclose()
+
+
 async def shutdown_workday_browser() -> str:
     try:
         if _workday_service:
             await _workday_service.close()
-            return json.dumps({
+            return _dumps({
                 "success": True,
                 "message": "Browser closed successfully."
             })
-        return json.dumps({
+        return _dumps({
             "success": False,
             "message": "WorkdayService is not active."
         })
     except Exception as e:
-        return json.dumps({"success": False, "error": str(e)})
+        return _dumps({"success": False, "error": str(e)})
 
 
 def shutdown_workday_browser_sync() -> str:
@@ -185,44 +287,66 @@ t.start()
 
 
 def run_async_tool(tool_coro):
-    print("[DEBUG] run_async_tool: scheduling on background loop")
+    logger.debug("run_async_tool: scheduling on background loop")
     try:
         future = asyncio.run_coroutine_threadsafe(tool_coro, _background_loop)
         result = future.result()  # This blocks but safely waits for the result
-        print("[DEBUG] run_async_tool: coroutine finished")
+        logger.debug("run_async_tool: coroutine finished")
         return result
     except Exception as e:
-        print(f"[ERROR] Exception in run_async_tool: {e}")
-        return json.dumps({
+        logger.exception("Exception in run_async_tool: %s", e)
+        return _dumps({
             "success": False,
             "error": f"Exception during async tool run: {str(e)}"
         })
 
 
+# Canvas allows a limited number of concurrent requests per token
+_CANVAS_CONCURRENCY = 10
+
+
 # sync wrapper for async functions
+# The agent's tools keep the browser open so the next Workday request reuses
+# the logged-in session instead of signing in again
 def navigate_to_workday_registration_sync(mock_mode: bool = False) -> str:
-    print("[DEBUG] Called sync wrapper for registration")
-    return run_async_tool(navigate_to_workday_registration(mock_mode))
+    logger.debug("Called sync wrapper for registration")
+    return run_async_tool(
+        navigate_to_workday_registration(mock_mode, stay_open=True))
 
 
 def navigate_to_workday_financial_account_sync(mock_mode: bool = False) -> str:
-    print("[DEBUG] Called sync wrapper for financial")
-    return run_async_tool(navigate_to_workday_financial_account(mock_mode))
+    logger.debug("Called sync wrapper for financial")
+    return run_async_tool(
+        navigate_to_workday_financial_account(mock_mode, stay_open=True))
 
 
 def get_advisors_info_sync() -> str:
     return run_async_tool(get_advisors_info())
 
 
-def get_course_assignments(course_identifier: str) -> str:
+async def _resolve_course(course_identifier: str) -> Optional[dict]:
+    # Name matching may fetch the course list, which is still a sync call
+    return await _singleflight(
+        ("course", course_identifier.strip().lower()),
+        lambda: asyncio.to_thread(_canvas().get_course_info, course_identifier))
+
+
+async def get_course_assignments(course_identifier: str,
+                                 force_refresh: bool = False) -> str:
     """
     Gets upcoming assignments for a specific course.
 
     :param course_identifier: The course name or ID (e.g., "CS115", "Machine Learning").
+    :param force_refresh: Skip cached results, e.g. when the user says they just submitted something.
     :return: A JSON string of assignment information.
     """
-    assignments = _canvas_service.get_assignments_for_course(course_identifier)
-    return json.dumps(assignments)
+    course = await _resolve_course(course_identifier)
+    if not course:
+        return _dumps({"courses": []})
+    assignments = await _assignments_for_course_async(
+        course,
+        _canvas().async_client(), force_refresh)
+    return _dumps(_prune_assignments(assignments))
 
 
 def get_current_courses() -> str:
@@ -231,85 +355,160 @@ def get_current_courses() -> str:
 
     :return: A JSON string of course information.
     """
-    courses = _canvas_service.get_current_courses()
-    return json.dumps(courses)
+    courses = _canvas().get_current_courses()
+    return _dumps(_prune_courses(courses))
+
+
+async def _fetch_per_course(
+        fetch, courses: list) -> AsyncIterator[Tuple[dict, Any]]:
+    """
+    Run fetch(course, client) for every course concurrently and yield
+    (course, result) in course order, each as soon as it is ready
+    """
+    semaphore = asyncio.Semaphore(_CANVAS_CONCURRENCY)
+    client = _canvas().async_client()
+
+    async def fetch_one(course):
+        async with semaphore:
+            return await fetch(course, client)
+
+    tasks = [asyncio.ensure_future(fetch_one(course)) for course in courses]
+    try:
+        for course, task in zip(courses, tasks):
+            yield course, await task
+    finally:
+        # The consumer stopped early (e.g. the client disconnected)
+        for task in tasks:
+            task.cancel()
+
+
+async def _iter_courses_json(pairs: AsyncIterator[Tuple[dict, Any]], key: str,
+                             prune: Callable[[dict],
+                                             dict]) -> AsyncIterator[bytes]:
+    """
+    Yield {"courses": [...]} one course at a time, so the combined list of
+    every course's pruned data is never built before serializing
+    """
+    yield b'{"courses":['
+    first = True
+    async for course, result in pairs:
+        if not result:
+            continue
+        if not first:
+            yield b","
+        first = False
+        yield orjson.dumps({"course_name": course["name"], key: prune(result)})
+    yield b"]}"
+
+
+async def iter_upcoming_courses_assignments() -> AsyncIterator[bytes]:
+    """
+    The JSON of get_upcoming_courses_assignments as chunks, each course's
+    written as soon as its assignments arrive, for streaming responses
+    """
+    courses = await _current_courses_async()
+    pairs = _fetch_per_course(_assignments_for_course_async, courses)
+    async for chunk in _iter_courses_json(pairs, "assignments",
+                                          _prune_assignments):
+        yield chunk
 
 
-def get_upcoming_courses_assignments() -> str:
+async def get_upcoming_courses_assignments() -> str:
     """
     Gets upcoming assignments for all enrolled courses.
 
     :return: A JSON string of assignments for all courses.
     """
-    courses = _canvas_service.get_current_courses()
-    all_assignments = []
+    return b"".join([
+        chunk async for chunk in iter_upcoming_courses_assignments()
+    ]).decode()
 
-    for course in courses:
-        assignments = _canvas_service.get_assignments_for_course(course['id'])
-        if assignments:
-            all_assignments.append({
-                "course_name": course["name"],
-                "assignments": assignments
-            })
 
-    return json.dumps({"courses": all_assignments})
+async def _stevens_lookup(kind: str, query: str,
+                          fetch: Callable[[str], Awaitable[Any]]) -> Any:
+    # Keyed on the normalized query so "Spring Break" and "spring break "
+    # share an entry; empty results are not cached
+    key = (kind, query.strip().lower())
+    value = _stevens_cache.get(key)
+    if value is None:
+        value = await _singleflight(key, lambda: fetch(query))
+        if value:
+            _stevens_cache[key] = value
+    return value
 
 
 # TODO: add db, these info will either be stored in db or vector db
-def get_academic_calendar_event(event_type: str) -> str:
+async def get_academic_calendar_event(event_type: str) -> str:
     """
     Gets information about academic calendar events.
 
     :param event_type: Type of academic calendar event (e.g., 'spring break', 'finals week').
     :return: A JSON string of calendar event information.
     """
-    event = _stevens_service.get_calendar_event(event_type)
-    return json.dumps(event)
+    event = await _stevens_lookup("calendar", event_type,
+                                  _stevens().get_calendar_event)
+    return _dumps(event)
 
 
 # TODO: add db, these info will either be stored in db or vector db
-def get_program_requirements(program: str) -> str:
+async def get_program_requirements(program: str) -> str:
     """
     Gets course requirements for a specific degree program.
 
     :param program: Degree program name (e.g., 'AAI masters', 'Computer Science PhD').
     :return: A JSON string of program requirements.
     """
-    requirements = _stevens_service.get_program_requirements(program)
-    return json.dumps(requirements)
+    requirements = await _stevens_lookup("program", program,
+                                         _stevens().get_program_requirements)
+    return _dumps(requirements)
+
+
+async def iter_announcements_for_all_courses() -> AsyncIterator[bytes]:
+    """
+    The JSON of get_announcements_for_all_courses as chunks, one per
+    course, for streaming responses
+    """
+    courses = await _current_courses_async()
+    results = await _canvas().get_announcements_for_courses_async(
+        courses,
+        _canvas().async_client())
+
+    async def pairs():
+        for pair in zip(courses, results):
+            yield pair
 
+    async for chunk in _iter_courses_json(pairs(), "announcements",
+                                          _prune_announcements):
+        yield chunk
 
-def get_announcements_for_all_courses() -> str:
+
+async def get_announcements_for_all_courses() -> str:
     """
     Gets announcements for all enrolled courses.
 
     :return: A JSON string of announcements for all courses.
     """
-    courses = _canvas_service.get_current_courses()
-    all_announcements = []
-
-    for course in courses:
-        announcements = _canvas_service.get_announcements_for_course(
-            course['id'])
-        if announcements:
-            all_announcements.append({
-                "course_name": course["name"],
-                "announcements": announcements
-            })
+    return b"".join([
+        chunk async for chunk in iter_announcements_for_all_courses()
+    ]).decode()
 
-    return json.dumps({"courses": all_announcements})
 
-
-def get_announcements_for_specific_courses(course_identifier: str) -> str:
+async def get_announcements_for_specific_courses(
+        course_identifier: str, force_refresh: bool = False) -> str:
     """
     Gets announcements for specific courses.
 
     :param course_identifier: Course code or name (e.g., 'EE 553', 'C++').
+    :param force_refresh: Skip cached results and fetch the latest announcements.
     :return: A JSON string of announcements for the specified course.
     """
-    announcements = _canvas_service.get_announcements_for_course(
-        course_identifier)
-    return json.dumps(announcements)
+    course = await _resolve_course(course_identifier)
+    if not course:
+        return _dumps({"courses": []})
+    announcements = await _canvas().get_announcements_for_course_async(
+        course,
+        _canvas().async_client(), force_refresh)
+    return _dumps(_prune_announcements(announcements))
 
 
 def get_grades() -> str:
@@ -321,8 +520,8 @@ def get_grades() -> str:
     
     :return: A JSON string of grades information for all courses.
     """
-    grades = _canvas_service.get_simplified_grades()
-    return json.dumps(grades)
+    grades = _canvas().get_simplified_grades()
+    return _dumps(grades)
 
 
 def get_grades_for_course(course_identifier: str) -> str:
@@ -332,12 +531,12 @@ def get_grades_for_course(course_identifier: str) -> str:
     :param course_identifier: The course name, code, or ID (e.g., "CS115", "Machine Learning").
     :return: A JSON string of grades information for the specified course.
     """
-    grades = _canvas_service.get_simplified_grades(course_identifier)
-    return json.dumps(grades)
+    grades = _canvas().get_simplified_grades(course_identifier)
+    return _dumps(grades)
 
 
 # Register all functions
-user_functions: Set[Callable[..., Any]] = {
+user_functions: FrozenSet[Callable[..., Any]] = frozenset({
     get_course_assignments,
     get_current_courses,
     get_upcoming_courses_assignments,
@@ -349,98 +548,4 @@ user_functions: Set[Callable[..., Any]] = {
     get_advisors_info_sync,
     get_grades,
     get_grades_for_course,
-}
-# Define all the available user functions with their schemas
-user_functions_schema = [{
-    "name": "get_user_context",
-    "description":
-    "Retrieves context data for the user from multiple sources in a single call. The user profile comes from the User Service, while courses, assignments, and announcements come from Canvas API, and professors data comes from Stevens API. Use this to request several types of data at once. For example, to get profile and assignments information, call get_user_context(context_types=['profile', 'assignments']).",
-    "parameters": {
-        "type": "object",
-        "properties": {
-            "context_types": {
-                "type": "array",
-                "description": "List of context types to retrieve",
-                "items": {
-                    "type":
-                    "string",
-                    "enum": [
-                        "profile", "courses", "assignments", "announcements",
-                        "professors"
-                    ]
-                }
-            }
-        },
-        "required": ["context_types"]
-    }
-}, {
-    "name": "get_course_assignments",
-    "description": "Get assignments for a specific course",
-    "parameters": {
-        "type": "object",
-        "properties": {
-            "course_identifier": {
-                "type": "string",
-                "description": "Course name, code, or ID"
-            }
-        },
-        "required": ["course_identifier"]
-    }
-}, {
-    "name": "navigate_to_workday_registration_sync",
-    "description":
-    "Navigate to the course registration page in Workday. This will open a browser and prompt you to enter your credentials if not already logged in.",
-    "parameters": {
-        "type": "object",
-        "properties": {
-            "mock_mode": {
-                "type": "boolean",
-                "description": "Use mock mode for testing without Playwright"
-            },
-            "stay_open": {
-                "type":
-                "boolean",
-                "description":
-                "Stay open the browser after navigating to the registration page, set to true"
-            }
-        }
-    }
-}, {
-    "name": "navigate_to_workday_financial_account_sync",
-    "description":
-    "Navigate to the financial account page in Workday. This will open a browser and prompt you to enter your credentials if not already logged in.",
-    "parameters": {
-        "type": "object",
-        "properties": {
-            "mock_mode": {
-                "type": "boolean",
-                "description": "Use mock mode for testing without Playwright"
-            },
-            "stay_open": {
-                "type":
-                "boolean",
-                "description":
-                "Stay open the browser after navigating to the financial account page, set to true"
-            }
-        }
-    }
-}, {
-    "name": "get_advisors_info_sync",
-    "description": "Gets advisor contact information scraped from Workday",
-    "parameters": {
-        "type": "object",
-        "properties": {}
-    }
-}, {
-    "name": "get_grades",
-    "description":
-    "Get grades for all enrolled courses in a simplified format.",
-    "parameters": {}
-}, {
-    "name": "get_grades_for_course",
-    "description": "Get grades for a specific course in a simplified format.",
-    "parameters": {
-        "type": "object",
-        "properties": {}
-    }
-}]
+})
@@ -5,12 +5,31 @@ import logging
 from pathlib import Path
 from typing import Optional
 from datetime import datetime
-from playwright.async_api import async_playwright, BrowserContext, Page
+from playwright.async_api import async_playwright, Browser, BrowserContext, Page
 from dotenv import load_dotenv
 import asyncio
+import time
 
 logger = logging.getLogger(__name__)
 user_data_dir = str(Path(__file__).parent / "chrome_profile")
+# Workday drops idle sessions, so ping it well inside the timeout
+KEEPALIVE_INTERVAL = 300
+# Optional DevTools endpoint of an already running Chromium (started with
+# --remote-debugging-port). Parallel workers attach to it and open their own
+# context instead of each launching a browser.
+CDP_ENDPOINT = os.getenv("WORKDAY_CDP_ENDPOINT")
+# Cookies and localStorage of the last sign-in, for contexts that don't get
+# the persistent profile (CDP). Reused while younger than the SSO session.
+STORAGE_STATE_PATH = str(Path(__file__).parent / "workday_state.json")
+STORAGE_STATE_MAX_AGE = 12 * 60 * 60
+
+
+def _saved_storage_state() -> Optional[str]:
+    try:
+        age = time.time() - os.path.getmtime(STORAGE_STATE_PATH)
+    except OSError:
+        return None
+    return STORAGE_STATE_PATH if age < STORAGE_STATE_MAX_AGE else None
 
 load_dotenv()
 
@@ -21,9 +40,14 @@ class WorkdayService:
                  playwright,
                  current_academic_year="",
                  current_academic_semester="",
-                 graduate_level=""):
+                 graduate_level="",
+                 browser_context: Optional[BrowserContext] = None):
         self.playwright = playwright
-        self.browser_context: Optional[BrowserContext] = None
+        # A context passed in by the caller is shared (e.g. across test runs)
+        # and stays open when this service closes
+        self.browser_context: Optional[BrowserContext] = browser_context
+        self._owns_context = browser_context is None
+        self._cdp_browser: Optional[Browser] = None
         self.page: Optional[Page] = None
         self.screenshots_dir = os.path.abspath(
             os.path.join(os.path.dirname(__file__), "..",
@@ -33,18 +57,24 @@ class WorkdayService:
         self.current_academic_semester = current_academic_semester or "2025 Fall Semester(09/02/2025-12/22/2025)"
         self.graduate_level = graduate_level or "Graduate"
         self.username = os.getenv("WORKDAY_USERNAME")
-        print(f"WORKDAY_USERNAME: {self.username}")
         self.password = os.getenv("WORKDAY_PASSWORD")
         self.logged_in = False
+        self.home_url: Optional[str] = None
         self.advisors = []
-        self.browser_context = None
+        self._keepalive_task: Optional[asyncio.Task] = None
 
     async def start(self):
-        print("[DEBUG] WorkdayService.start() called")
+        logger.debug("WorkdayService.start() called")
         # playwright = await async_playwright().start()
-        print("[DEBUG] Playwright started")
-        self.browser_context = await self.playwright.chromium.launch_persistent_context(
-            user_data_dir=user_data_dir, headless=False)
+        logger.debug("Playwright started")
+        if self.browser_context is None and CDP_ENDPOINT:
+            self._cdp_browser = await self.playwright.chromium.connect_over_cdp(
+                CDP_ENDPOINT)
+            self.browser_context = await self._cdp_browser.new_context(
+                storage_state=_saved_storage_state())
+        elif self.browser_context is None:
+            self.browser_context = await self.playwright.chromium.launch_persistent_context(
+                user_data_dir=user_data_dir, headless=False)
         pages = self.browser_context.pages
         if pages and len(pages) > 0:
             self.page = pages[0]
@@ -54,32 +84,67 @@ class WorkdayService:
         self.page.set_default_timeout(30_000)
         self.page.set_default_navigation_timeout(60_000)
         asyncio.create_task(self._monitor_browser_close())
+        self._keepalive_task = asyncio.create_task(self._keepalive())
+
+    def is_alive(self) -> bool:
+        return (self.browser_context is not None and self.page is not None
+                and not self.page.is_closed())
+
+    def is_logged_in(self) -> bool:
+        return self.logged_in and self.is_alive()
+
+    async def _keepalive(self, interval: int = KEEPALIVE_INTERVAL):
+        """Keep the Workday session warm so a reused browser skips the login"""
+        while True:
+            await asyncio.sleep(interval)
+            if not self.is_alive():
+                break
+            if not self.logged_in:
+                continue
+            try:
+                # A request through the context carries the session cookies
+                # without navigating the page the user may be looking at
+                await self.browser_context.request.get(self.page.url)
+            except Exception as e:
+                logger.warning(f"Workday keepalive failed: {str(e)}")
 
     async def close(self):
-        print("[DEBUG] Closing WorkdayService browser...")
+        logger.debug("Closing WorkdayService browser...")
+        if self._keepalive_task:
+            self._keepalive_task.cancel()
+            self._keepalive_task = None
+        self.logged_in = False
+        if not self._owns_context:
+            self.browser_context = None
+            self.page = None
+            return
         if self.browser_context:
             await self.browser_context.close()
             self.browser_context = None
+        if self._cdp_browser:
+            # Only disconnects; the shared Chromium keeps running
+            await self._cdp_browser.close()
+            self._cdp_browser = None
         if self.playwright:
             await self.playwright.stop()
             self.playwright = None  # Optional
 
     async def _monitor_browser_close(self):
-        print("[DEBUG] Starting browser close watcher")
+        logger.debug("Starting browser close watcher")
         while True:
             await asyncio.sleep(2)
             if self.page and self.page.is_closed():
-                print("[DEBUG] Page was closed manually")
+                logger.debug("Page was closed manually")
                 try:
                     await self.close()
                 except Exception as e:
-                    print(f"[DEBUG] Browser was already closed: {e}")
+                    logger.debug("Browser was already closed: %s", e)
                 break
 
     async def login(self):
         html_content = await self.page.content()
         if "Stevens Institute of Technology - Sign In" in html_content:
-            print("Login page detected")
+            logger.debug("Login page detected")
             if not self.password:
                 raise ValueError(
                     "WORKDAY_PASSWORD environment variable is not set")
@@ -88,23 +153,38 @@ class WorkdayService:
                 self.password)
             await self.page.get_by_role("button", name="Sign in").click()
             await self.page.wait_for_url("**/home.htmld", timeout=60_000)
+            await self.browser_context.storage_state(path=STORAGE_STATE_PATH)
 
         landing_page_html = await self.page.content()
         if "window.workday" in landing_page_html:
             self.logged_in = True
+            self.home_url = self.page.url
             return True
         else:
+            # Forget the session so the next call starts from the sign-in
+            # link instead of the stale home page
+            self.logged_in = False
+            self.home_url = None
             return False
 
-    async def navigate_to_workday_registration(self, stay_open: bool = False):
-        try:
-            print("======Navigating to Workday registration page")
+    async def _ensure_logged_in(self) -> bool:
+        """Open the Workday home page, going through sign-in only if needed"""
+        if self.logged_in and self.home_url:
+            # Still signed in from an earlier call: go straight home. If the
+            # session has expired this lands on the sign-in page, which
+            # login() handles
+            await self.page.goto(self.home_url)
+        else:
             await self.page.goto("https://www.stevens.edu/it/services/workday")
             await self.page.click("text=Log in to Workday")
-            await self.page.wait_for_timeout(2000)
+            await self.page.wait_for_load_state("domcontentloaded")
+        return await self.login()
 
-            if await self.login():
-                await self.page.wait_for_timeout(3000)
+    async def navigate_to_workday_registration(self, stay_open: bool = False):
+        try:
+            logger.debug("Navigating to Workday registration page")
+            if await self._ensure_logged_in():
+                # click() waits for the Academics tile to be actionable
                 await self.page.click("text=Academics", timeout=10_000)
                 if not self.advisors:
                     await self.get_advisors()
@@ -112,35 +192,27 @@ class WorkdayService:
                                       timeout=10_000)
 
                 # Select calendar start date
-                start_date_input = self.page.locator(
-                    "[data-uxi-element-id='selectinput-15$456818']")
-                await start_date_input.wait_for(state="visible")
-                await start_date_input.scroll_into_view_if_needed()
-                await start_date_input.click()
-                await self.page.wait_for_timeout(500)
+                # click() already waits for the element to be visible and
+                # scrolls it into view, so each step is one round trip
+                await self.page.locator(
+                    "[data-uxi-element-id='selectinput-15$456818']").click()
                 await self.page.locator(
                     "[data-automation-label='Semester Academic Calendar']"
                 ).click()
                 await self.scroll_until_visible(self.current_academic_year)
 
-                semester = self.page.locator(
+                await self.page.locator(
                     f"[data-automation-label='{self.current_academic_semester}']"
-                )
-                await semester.scroll_into_view_if_needed()
-                await semester.wait_for(state="visible")
-                await semester.click()
+                ).click()
 
                 # Academic level
                 level_input = self.page.locator(
                     "[data-uxi-element-id='selectinput-15$463917']")
                 await level_input.type(self.graduate_level, delay=100)
                 await self.page.keyboard.press("Enter")
-                await self.page.wait_for_timeout(2000)
-                grad_option = self.page.locator(
-                    f"[data-automation-label='{self.graduate_level}']")
-                await grad_option.scroll_into_view_if_needed()
-                await grad_option.wait_for(state="visible", timeout=5000)
-                await grad_option.click()
+                await self.page.locator(
+                    f"[data-automation-label='{self.graduate_level}']").click(
+                        timeout=5000)
 
                 # Submit
                 ok_button = self.page.locator(
@@ -154,24 +226,23 @@ class WorkdayService:
                         "Find Course Sections",
                         exact=True).wait_for(timeout=10000)
                 except Exception as e:
-                    print(
-                        f"[DEBUG] Error waiting for 'Find Course Sections' button: {e}"
-                    )
+                    logger.debug(
+                        "Error waiting for 'Find Course Sections' button: %s",
+                        e)
 
                 screenshot_path = os.path.join(
                     self.screenshots_dir,
                     f"workday_course_section/selected_calendar_{datetime.now().strftime('%Y-%m-%d_%H-%M-%S')}.png"
                 )
                 os.makedirs(os.path.dirname(screenshot_path), exist_ok=True)
-                await self.page.wait_for_timeout(2000)
                 await self.page.screenshot(path=screenshot_path)
 
                 if not stay_open:
-                    print("[DEBUG] Delaying close for 10 sec (demo mode)")
+                    logger.debug("Delaying close for 10 sec (demo mode)")
                     await asyncio.sleep(10)  # Delay for demo purposes
                     await self.close()
                 else:
-                    print("[DEBUG] Leaving browser open (stay_open=True)")
+                    logger.debug("Leaving browser open (stay_open=True)")
 
                 return {
                     "success": True,
@@ -193,18 +264,10 @@ class WorkdayService:
 
     async def navigate_to_workday_financial_account(self, stay_open):
         try:
-            await self.page.goto("https://www.stevens.edu/it/services/workday")
-            await self.page.click("text=Log in to Workday")
-            await self.page.wait_for_timeout(2000)
-
-            if await self.login():
-                # await self.page.click("text=Finances")
-                # await self.page.wait_for_timeout(5000)
-                finances_button = self.page.locator(
-                    "button[aria-label='Finances']")
-                await finances_button.scroll_into_view_if_needed()
-                await finances_button.wait_for(state="visible")
-                await finances_button.click()
+            if await self._ensure_logged_in():
+                await self.page.get_by_role("button",
+                                            name="Finances",
+                                            exact=True).click()
                 screenshot_path = os.path.join(
                     self.screenshots_dir,
                     f"workday_financial_account/financial_account_{datetime.now().strftime('%Y-%m-%d_%H-%M-%S')}.png"
@@ -212,11 +275,11 @@ class WorkdayService:
                 os.makedirs(os.path.dirname(screenshot_path), exist_ok=True)
                 await self.page.screenshot(path=screenshot_path)
                 if not stay_open:
-                    print("[DEBUG] Delaying close for 5 sec (demo mode)")
+                    logger.debug("Delaying close for 5 sec (demo mode)")
                     await asyncio.sleep(5)  # Delay for demo purposes
                     await self.close()
                 else:
-                    print("[DEBUG] Leaving browser open (stay_open=True)")
+                    logger.debug("Leaving browser open (stay_open=True)")
 
                 return {
                     "success": True,
@@ -285,7 +348,7 @@ class WorkdayService:
             }
         """)
 
-        print("Advisor info:", advisors)
+        logger.debug("Advisor info: %s", advisors)
         self.advisors = advisors
 
     def get_advisors_list(self):
@@ -1,7 +1,7 @@
 import logging
 from apscheduler.schedulers.background import BackgroundScheduler
 from datetime import datetime
-import json
+import orjson
 
 try:
     import redis
@@ -47,7 +47,7 @@ class CacheManager:
         """Retrieve data from cache"""
         try:
             data = self.redis_client.get(key)
-            return json.loads(data) if data else None
+            return orjson.loads(data) if data else None
         except Exception as e:
             logging.error(f"Error retrieving data from cache: {str(e)}")
             return None
@@ -55,7 +55,7 @@ class CacheManager:
     def set_cached_data(self, key, data):
         """Store data in cache"""
         try:
-            self.redis_client.set(key, json.dumps(data))
+            self.redis_client.set(key, orjson.dumps(data))
         except Exception as e:
             logging.error(f"Error storing data in cache: {str(e)}")
             raise
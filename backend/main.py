@@ -1,4 +1,5 @@
 from dotenv import load_dotenv
+import asyncio
 import os
 import logging
 from app.context import get_service_context
@@ -17,11 +18,17 @@ load_dotenv(env_path)
 
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse, StreamingResponse
 from app.core.config import settings
 from contextlib import asynccontextmanager
 from app.api import chat, workday
 from cache_manager import CacheManager
 from app.services.canvas_service import CanvasService
+from app.services.model_service import (shutdown_model_service,
+                                         shutdown_tool_pool)
+from app.services.user_functions import (
+    close_canvas_client, iter_announcements_for_all_courses,
+    iter_upcoming_courses_assignments, shutdown_workday_browser_sync)
 
 # global cache manager for repeat queries
 cache_manager = CacheManager()
@@ -35,6 +42,13 @@ async def lifespan(app: FastAPI):
     yield
 
     logger.info("Application is shutting down...")
+    await shutdown_model_service()
+    shutdown_tool_pool()
+    await close_canvas_client()
+    # The Workday browser is kept open across tool calls, so close it once
+    # here. It lives on the tools' background loop; the sync wrapper waits
+    # for it there.
+    await asyncio.to_thread(shutdown_workday_browser_sync)
 
 
 # initialize app with the lifespan
@@ -43,6 +57,8 @@ app = FastAPI(
     description="Backend API for Stevens AI Assistant Chrome Extension",
     version="1.0.0",
     lifespan=lifespan,
+    # Serialize every JSON response (chat replies, Canvas data) with orjson
+    default_response_class=ORJSONResponse,
 )
 
 # cors
@@ -94,6 +110,26 @@ async def test_canvas_assignments(course_id: int):
     }
 
 
+@app.get("/test/canvas/upcoming_assignments")
+async def test_canvas_upcoming_assignments():
+    """
+    Test endpoint for upcoming assignments across all courses, streamed a
+    course at a time instead of buffered into one response
+    """
+    return StreamingResponse(iter_upcoming_courses_assignments(),
+                             media_type="application/json")
+
+
+@app.get("/test/canvas/announcements")
+async def test_canvas_announcements():
+    """
+    Test endpoint for announcements across all courses, streamed a course
+    at a time
+    """
+    return StreamingResponse(iter_announcements_for_all_courses(),
+                             media_type="application/json")
+
+
 # dependency injection for stevens services
 # TODO: need to define these functions
 @app.get("/calendar_events")